@@ -0,0 +1,78 @@
+"""
+Before/after microbenchmark of SensorCTRNN.euler_step. The reference is
+the original implementation, frozen here with its per-step
+np.random.normal noise draw, which allocates new arrays on every call.
+
+Usage: python benchmarks/euler_step.py
+"""
+
+import os
+import sys
+import timeit
+import numpy as np
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+
+from relcat import SensorCTRNN
+
+def reference_sigmoid(x):
+
+    return 1.0 / (1.0 + np.exp(-x))
+
+def reference_white_noise(network, step_size):
+    """
+    The original SensorCTRNN.white_noise, which draws a new sample on
+    every step even when noise_strength is zero
+    """
+
+    return np.sqrt(step_size * network.rtaus) \
+        * np.random.normal(loc=0.0, scale=1.0,
+                           size=(network.circuit_size, 1)) \
+        * network.noise_strength
+
+def reference_euler_step(network, states, outputs, step_size):
+    """
+    The original SensorCTRNN.euler_step, working on separate state and
+    output arrays so the network under test is left untouched.
+    """
+
+    inputs = np.dot(network.sensor_weights.T, network.sensor_states) \
+                + np.dot(network.circuit_weights.T, outputs)
+    states += step_size * network.rtaus \
+                * (inputs - states) + reference_white_noise(network, step_size)
+    np.clip(states, -network.maxstate, network.maxstate, out=states)
+    return reference_sigmoid(network.gains * states + network.biases)
+
+def time_euler_step(circuit_size, num_of_sensors, number=20000, repeat=5):
+
+    network = SensorCTRNN(circuit_size, num_of_sensors)
+    rng = np.random.RandomState(0)
+    network.sensor_weights = rng.uniform(-16, 16, network.sensor_weights.shape)
+    network.circuit_weights = rng.uniform(-16, 16,
+                                          network.circuit_weights.shape)
+    network.set_biases(rng.uniform(-16, 16, circuit_size))
+    network.set_time_constants(rng.uniform(1, 30, circuit_size))
+    network.initialize()
+    network.sensor_states = rng.uniform(0, 1, (num_of_sensors, 1))
+
+    states = network.ctrnn_states.copy()
+    outputs = [network.ctrnn_outputs.copy()]
+    def before():
+        outputs[0] = reference_euler_step(network, states, outputs[0], 0.1)
+
+    def after():
+        network.euler_step(0.1)
+
+    before_time = min(timeit.repeat(before, number=number, repeat=repeat))
+    after_time = min(timeit.repeat(after, number=number, repeat=repeat))
+
+    return before_time / number, after_time / number
+
+if __name__ == '__main__':
+
+    for circuit_size, num_of_sensors in [(5, 7), (10, 7), (5, 100)]:
+        before, after = time_euler_step(circuit_size, num_of_sensors)
+        print("circuit_size={0:3d} sensors={1:3d}: before {2:6.2f} us, "
+              "after {3:6.2f} us, speedup {4:.2f}x".format(circuit_size,
+              num_of_sensors, before * 1e6, after * 1e6, before / after))
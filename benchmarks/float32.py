@@ -0,0 +1,47 @@
+"""
+Accuracy and speed of the float32 simulation mode, measured against the
+float64 reference.
+
+For each integrator it reports the same differences as
+benchmarks/integrators.py, and the speedup of both evaluate_population
+and of serial evaluation of a single genome.
+
+Usage: python benchmarks/float32.py [num_genomes]
+"""
+
+import os
+import sys
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+
+from relcat import RelationalCategorization
+from suite import accuracy_differences
+from suite import accuracy_run
+from suite import best_time
+from suite import fittest_genomes
+
+INTEGRATORS = ('euler', 'exponential', 'rk4')
+
+def serial_time(dtype, integrator, x):
+
+    task = RelationalCategorization(dtype=dtype, integrator=integrator)
+
+    return best_time(lambda: task(x), repeat=1)
+
+if __name__ == '__main__':
+
+    num_genomes = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    X = fittest_genomes(num_genomes)
+
+    print("integrator   max |dF|  median |dF|  outcomes changed  "
+          "batch speedup  serial speedup")
+    for integrator in INTEGRATORS:
+        reference_run = accuracy_run(X, dtype='float64',
+                                     integrator=integrator)
+        run = accuracy_run(X, dtype='float32', integrator=integrator)
+        print("{:<12} {:<9.2e} {:<12.2e} {:<17.4f} {:<14.2f} {:.2f}".format(
+            integrator, *accuracy_differences(run, reference_run),
+            reference_run[2] / run[2],
+            serial_time('float64', integrator, X[0])
+                / serial_time('float32', integrator, X[0])))
@@ -0,0 +1,43 @@
+"""
+Accuracy and speed of the SensorCTRNN integrators at larger step sizes,
+measured against forward Euler at the default step size of 0.1.
+
+For each integrator and step size it reports the largest and median
+difference of the task fitness of the genomes of suite.fittest_genomes,
+the fraction of validation trials whose catch/avoid outcome changes, and
+the speedup of evaluate_population.
+
+Usage: python benchmarks/integrators.py [num_genomes]
+"""
+
+import os
+import sys
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+
+from suite import accuracy_differences
+from suite import accuracy_run
+from suite import fittest_genomes
+
+REFERENCE = ('euler', 0.1)
+SETTINGS = [('euler', 0.2), ('exponential', 0.2), ('rk4', 0.2),
+            ('euler', 0.3), ('exponential', 0.3), ('rk4', 0.3),
+            ('exponential', 0.5), ('rk4', 0.5)]
+
+if __name__ == '__main__':
+
+    num_genomes = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    X = fittest_genomes(num_genomes)
+
+    reference_run = accuracy_run(X, integrator=REFERENCE[0],
+                                 step_size=REFERENCE[1])
+    print("reference " + REFERENCE[0] + " " + str(REFERENCE[1]) + ": "
+          + "{:.2f}".format(reference_run[2]) + " s")
+    print("integrator   step  max |dF|  median |dF|  outcomes changed  "
+          "speedup")
+    for integrator, step_size in SETTINGS:
+        run = accuracy_run(X, integrator=integrator, step_size=step_size)
+        print("{:<12} {:<5} {:<9.4f} {:<12.4f} {:<17.3f} {:.1f}x".format(
+            integrator, step_size, *accuracy_differences(run, reference_run),
+            reference_run[2] / run[2]))
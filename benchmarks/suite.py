@@ -0,0 +1,323 @@
+"""
+Benchmark suite for the simulation hot paths.
+
+Times the CTRNN step, ray clipping, single trials, full evaluations,
+validation runs and batched population evaluation, and reports steps/sec
+and trials/sec. It also times `import relcat` in a fresh interpreter,
+whose budget is enforced by tests/test_import.py. Every run is appended
+with the commit it measured to benchmarks/results.jsonl, and compared
+against benchmarks/baseline.json.
+Benchmarks that are slower than the baseline by more than the tolerance
+are flagged and make the suite exit with status 1.
+
+Usage: python benchmarks/suite.py [--quick] [--save-baseline]
+    [--tolerance 0.2] [--only name_prefix]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import numpy as np
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+
+from relcat import RelationalCategorization
+from relcat import SensorAgent
+from relcat import Circle
+from relcat import Ray
+
+BASELINE_PATH = os.path.join(BENCHMARK_DIR, 'baseline.json')
+RESULTS_PATH = os.path.join(BENCHMARK_DIR, 'results.jsonl')
+
+def best_time(function, number=1, repeat=3):
+    """
+    Returns the best time of a single call over repeat runs of number calls
+    """
+
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        for j in range(number):
+            function()
+        times.append((time.perf_counter() - start) / number)
+
+    return min(times)
+
+def genomes(task, num_genomes):
+
+    return np.random.RandomState(0).uniform(size=(num_genomes,
+                                                  task.num_parameters))
+
+def fittest_genomes(num_genomes, num_samples=None):
+    """
+    Returns the fittest num_genomes of num_samples random genomes, by
+    default ten times as many. Most random genomes never move the agent
+    and score the same under any task setting, so accuracy comparisons
+    use these instead.
+    """
+
+    if num_samples is None:
+        num_samples = 10 * num_genomes
+    task = RelationalCategorization(batch_trials=True)
+    X = genomes(task, num_samples)
+
+    return X[np.argsort(task.evaluate_population(X))[:num_genomes]]
+
+def accuracy_run(X, **kwargs):
+    """
+    Returns the costs of the genomes X and the catch outcomes of their
+    ordered validation grids on a batched task built with kwargs, and the
+    time evaluate_population took
+    """
+
+    task = RelationalCategorization(batch_trials=True, **kwargs)
+    start = time.perf_counter()
+    costs = task.evaluate_population(X)
+    elapsed = time.perf_counter() - start
+    catches = np.array([ task.ordered_validation_run(x, 10)[0] for x in X ])
+
+    return costs, catches, elapsed
+
+def accuracy_differences(run, reference_run):
+    """
+    Returns the largest and median difference of the costs of two
+    accuracy runs, and the fraction of catch outcomes that changed
+    """
+
+    difference = np.abs(run[0] - reference_run[0])
+
+    return difference.max(), np.median(difference), \
+        np.mean(run[1] != reference_run[1])
+
+def make_agent(task, x):
+
+    agent = SensorAgent(task.agent_radius,
+        task.mass, task.visual_angle, task.num_rays,
+        task.max_ray_length, task.initial_agent_x, task.initial_agent_y,
+        task.circuit_size, task.max_velocity, noise_strength=task.noise_strength,
+        integrator=task.integrator, dtype=task.dtype)
+    task.map_search_parameters(x, agent.nervous_system)
+
+    return agent
+
+def make_ball(task):
+
+    return Circle(task.circle_size, task.initial_agent_x, task.world_top,
+                  0.0, task.obj_velocity)
+
+def grid_steps(task):
+    """
+    Number of steps in the trials of one evaluation
+    """
+
+    rows, cols, presented_sizes, comparison_sizes = task._trial_grid()
+    return sum(task.trial_length(presented_sizes[k], comparison_sizes[k])
+               for k in range(rows.shape[0])), rows.shape[0]
+
+def bench_import(quick):
+
+    script = 'import time\n' \
+             'start = time.perf_counter()\n' \
+             'import relcat\n' \
+             'print(time.perf_counter() - start)\n'
+    times = []
+    for i in range(3 if quick else 10):
+        times.append(float(subprocess.check_output(
+            [sys.executable, '-c', script],
+            cwd=os.path.dirname(BENCHMARK_DIR)).decode()))
+
+    return {'seconds': min(times)}
+
+def bench_euler_step(quick):
+
+    task = RelationalCategorization()
+    network = make_agent(task, genomes(task, 1)[0]).nervous_system
+    network.sensor_states = np.random.RandomState(0).uniform(0, 1,
+                                (task.num_rays, 1))
+    number = 2000 if quick else 20000
+    seconds = best_time(lambda: network.euler_step(task.step_size), number)
+
+    return {'seconds': seconds, 'steps_per_sec': 1.0 / seconds}
+
+def bench_ray_intersection(quick):
+
+    task = RelationalCategorization()
+    ball = make_ball(task)
+    ball.set_position(task.initial_agent_x, 150.0)
+    ball.set_size(15.0)
+    ray = Ray()
+    def clip():
+        ray.x1, ray.y1, ray.x2, ray.y2 = 200.0, 285.0, 200.0, 50.0
+        ball.ray_intersection(ray)
+
+    number = 2000 if quick else 20000
+    seconds = best_time(clip, number)
+
+    return {'seconds': seconds, 'rays_per_sec': 1.0 / seconds}
+
+def bench_initialize_ray_sensors(quick):
+
+    task = RelationalCategorization()
+    agent = make_agent(task, genomes(task, 1)[0])
+    ball = make_ball(task)
+    ball.set_position(task.initial_agent_x, 150.0)
+    ball.set_size(15.0)
+    number = 1000 if quick else 10000
+    seconds = best_time(lambda: agent.initialize_ray_sensors(ball), number)
+
+    return {'seconds': seconds, 'steps_per_sec': 1.0 / seconds}
+
+def bench_trial(quick):
+
+    task = RelationalCategorization()
+    agent = make_agent(task, genomes(task, 1)[0])
+    ball = make_ball(task)
+    seconds = best_time(lambda: task.trial(agent, ball, 30.0, 40.0),
+                        number=2 if quick else 10)
+
+    return {'seconds': seconds, 'trials_per_sec': 1.0 / seconds,
+            'steps_per_sec': task.trial_length(30.0, 40.0) / seconds}
+
+def bench_call(quick):
+
+    task = RelationalCategorization()
+    x = genomes(task, 1)[0]
+    seconds = best_time(lambda: task(x), repeat=1 if quick else 3)
+    num_steps, num_trials = grid_steps(task)
+
+    return {'seconds': seconds, 'trials_per_sec': num_trials / seconds,
+            'steps_per_sec': num_steps / seconds}
+
+def bench_ordered_validation_run(quick):
+
+    task = RelationalCategorization()
+    x = genomes(task, 1)[0]
+    num_sizes = 4 if quick else 8
+    seconds = best_time(lambda: task.ordered_validation_run(x, num_sizes),
+                        repeat=1 if quick else 3)
+
+    return {'seconds': seconds,
+            'trials_per_sec': num_sizes * num_sizes / seconds}
+
+def bench_population(quick, num_genomes, num_rays, num_interneurons):
+
+    task = RelationalCategorization(num_rays=num_rays,
+                                    num_interneurons=num_interneurons)
+    X = genomes(task, num_genomes)
+    task.evaluate_population(X[:1])
+    seconds = best_time(lambda: task.evaluate_population(X),
+                        repeat=1 if quick else 3)
+    num_steps, num_trials = grid_steps(task)
+
+    return {'seconds': seconds,
+            'trials_per_sec': num_genomes * num_trials / seconds,
+            'steps_per_sec': num_genomes * num_steps / seconds}
+
+def benchmarks(quick):
+    """
+    Returns (name, function) pairs of every benchmark
+    """
+
+    suite = [('import', bench_import),
+             ('euler_step', bench_euler_step),
+             ('ray_intersection', bench_ray_intersection),
+             ('initialize_ray_sensors', bench_initialize_ray_sensors),
+             ('trial', bench_trial),
+             ('call', bench_call),
+             ('ordered_validation_run', bench_ordered_validation_run)]
+    population_sizes = (10, 50) if quick else (10, 50, 200)
+    for num_genomes in population_sizes:
+        suite.append(('population_n' + str(num_genomes) + '_r7_i3',
+            lambda quick, n=num_genomes: bench_population(quick, n, 7, 3)))
+    for num_rays, num_interneurons in [(15, 3), (7, 6)]:
+        suite.append(('population_n50_r' + str(num_rays) + '_i'
+                      + str(num_interneurons),
+            lambda quick, r=num_rays, i=num_interneurons:
+                bench_population(quick, 50, r, i)))
+
+    return suite
+
+def commit_id():
+
+    try:
+        return subprocess.check_output(['git', 'describe', '--always',
+            '--dirty'], cwd=BENCHMARK_DIR,
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def compare(results, baseline, tolerance):
+    """
+    Returns the names of the benchmarks that are slower than the baseline
+    by more than the tolerance
+    """
+
+    regressions = []
+    for name, result in results.items():
+        if name in baseline and result['seconds'] \
+                > baseline[name]['seconds'] * (1 + tolerance):
+            regressions.append(name)
+
+    return regressions
+
+def format_result(name, result, baseline):
+
+    rates = ', '.join(key + '=' + '{:.4g}'.format(value)
+                      for key, value in result.items() if key != 'seconds')
+    line = '{:<28} {:>12.6g} s  {}'.format(name, result['seconds'], rates)
+    if name in baseline:
+        ratio = result['seconds'] / baseline[name]['seconds']
+        line += '  ({:.2f}x baseline time)'.format(ratio)
+
+    return line
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='relcat benchmark suite')
+    parser.add_argument('--quick', action='store_true',
+                        help='fewer repeats and smaller problems')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='store this run as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed slowdown before flagging a regression')
+    parser.add_argument('--only', default='',
+                        help='only run benchmarks starting with this prefix')
+    args = parser.parse_args()
+
+    # Quick runs time smaller problems, so they are only compared with a
+    # quick baseline
+    baseline = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as baseline_file:
+            baseline_run = json.load(baseline_file)
+        if baseline_run['quick'] == args.quick:
+            baseline = baseline_run['results']
+        else:
+            print('baseline was not run with quick=' + str(args.quick)
+                  + ', not comparing')
+
+    results = {}
+    for name, function in benchmarks(args.quick):
+        if name.startswith(args.only):
+            results[name] = function(args.quick)
+            print(format_result(name, results[name], baseline))
+
+    run = {'commit': commit_id(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+           'quick': args.quick, 'numpy': np.__version__,
+           'python': sys.version.split()[0], 'results': results}
+    with open(RESULTS_PATH, 'a') as results_file:
+        results_file.write(json.dumps(run) + '\n')
+
+    if args.save_baseline:
+        with open(BASELINE_PATH, 'w') as baseline_file:
+            json.dump(run, baseline_file, indent=2, sort_keys=True)
+        print('saved baseline for ' + run['commit'])
+
+    regressions = compare(results, baseline, args.tolerance)
+    for name in regressions:
+        print('REGRESSION: ' + name)
+    sys.exit(1 if regressions else 0)
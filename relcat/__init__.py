@@ -1,15 +1,31 @@
 from .relcat import RelationalCategorization
+from .relcat import FitnessBound
+from .relcat import FitnessCache
+from .relcat import TrialSnapshot
 from .relcat import rescale_parameter
 from .relcat import vpython_visualization
+from .relcat import vpython_replay
 from .relcat import plot_noise_analysis
 from .relcat import noise_analysis
+from .relcat import load_noise_analysis
 from .relcat import plot_catch_contour
 from .sensor_agent import reset_ray
 from .sensor_agent import SensorAgent
 from .sensor_ctrnn import sigmoid
 from .sensor_ctrnn import SensorCTRNN
+from .sensor_ctrnn import spawn_seed
 from .visual_objects import Ray
+from .visual_objects import RayBundle
 from .visual_objects import VisualObject
 from .visual_objects import Circle
 from .visual_objects import Diamond
-from .visual_objects import Line
\ No newline at end of file
+from .visual_objects import Line
+from .visual_objects import circle_ray_intersections
+from .visual_objects import Scene
+from .batch_simulation import BatchSimulation
+from .recorder import TrialRecorder
+from .archive import record_trials
+from .archive import TrajectoryArchive
+from .archive import vpython_archive_visualization
+from .parallel import PoolEvaluator
+from .instrumentation import Instrumentation
@@ -0,0 +1,194 @@
+"""
+Module for storing the recorded trajectories of many trials on disk.
+
+An archive is a directory holding one .npy column per recorded channel,
+with the samples of all trials stacked along the first axis, an index of
+where each trial starts along with its ball sizes and outcome, and a json
+file with the recording settings. Columns are opened memory-mapped, so
+trials are only paged in when they are read.
+"""
+
+import numpy as np
+import json
+import os
+from .sensor_agent import SensorAgent
+from .visual_objects import Circle
+from .recorder import TrialRecorder
+
+INDEX_DTYPE = np.dtype([('offset', np.int64), ('num_samples', np.int64),
+                        ('presented_size', np.float64),
+                        ('comparison_size', np.float64),
+                        ('success', np.int64), ('catch', np.int64)])
+
+def record_trials(task, x, path, presented_ball_sizes, comparison_ball_sizes,
+    channels=('ball', 'agent', 'rays'), decimation=1):
+    """
+    Runs a validation trial of genome x for every pair of presented and
+    comparison ball sizes, and writes the recorded channels into a new
+    archive at path. Returns the archive opened for reading.
+    """
+
+    presented_ball_sizes = np.asarray(presented_ball_sizes, dtype=float)
+    comparison_ball_sizes = np.asarray(comparison_ball_sizes, dtype=float)
+    num_trials = presented_ball_sizes.shape[0]
+
+    # Lay out the trials one after another
+    index = np.zeros(num_trials, dtype=INDEX_DTYPE)
+    index['presented_size'] = presented_ball_sizes
+    index['comparison_size'] = comparison_ball_sizes
+    for i in range(num_trials):
+        index['num_samples'][i] = task.trial_length(presented_ball_sizes[i],
+            comparison_ball_sizes[i]) // decimation + 1
+    index['offset'][1:] = np.cumsum(index['num_samples'])[:-1]
+    total_samples = int(index['num_samples'].sum())
+
+    # Generate agent
+    agent = SensorAgent(task.agent_radius,
+        task.mass, task.visual_angle, task.num_rays,
+        task.max_ray_length, task.initial_agent_x, task.initial_agent_y,
+        task.circuit_size, task.max_velocity, noise_strength=task.noise_strength,
+        integrator=task.integrator, dtype=task.dtype)
+
+    # Generate circle
+    ball = Circle(task.circle_size,
+                task.initial_agent_x, task.world_top,
+                0.0, task.obj_velocity)
+
+    task.map_search_parameters(x, agent.nervous_system)
+
+    os.makedirs(path, exist_ok=True)
+    recorder = TrialRecorder(channels, decimation)
+    columns = None
+    seeds = task.trial_seeds(num_trials)
+    for i in range(num_trials):
+        index['success'][i], index['catch'][i] = task.trial(agent, ball,
+            presented_ball_sizes[i], comparison_ball_sizes[i],
+            record=recorder, validation=True, seed=seeds[i])
+
+        # Columns are created once the per-sample shapes are known
+        if columns is None:
+            columns = { channel: np.lib.format.open_memmap(
+                            os.path.join(path, channel + '.npy'), mode='w+',
+                            shape=(total_samples,)
+                                + getattr(recorder, channel).shape[1:])
+                        for channel in recorder.channels }
+
+        start = index['offset'][i]
+        for channel, column in columns.items():
+            column[start:start + recorder.num_samples] = \
+                getattr(recorder, channel)
+
+    if columns is not None:
+        for column in columns.values():
+            column.flush()
+    np.save(os.path.join(path, 'index.npy'), index)
+    with open(os.path.join(path, 'meta.json'), 'w') as meta_file:
+        json.dump({'channels': list(channels), 'decimation': decimation,
+                   'step_size': task.step_size,
+                   'world_right': task.world_right,
+                   'world_bottom': task.world_bottom}, meta_file)
+
+    return TrajectoryArchive(path)
+
+class TrajectoryArchive:
+    """
+    Read access to an archive written by record_trials.
+
+    archive[i] returns a dict with the channels of trial i as views into
+    the memory-mapped columns, its sample times, and its index entry.
+    A slice or an array of indices returns a list of such dicts.
+    """
+
+    def __init__(self, path):
+
+        self.path = path
+        with open(os.path.join(path, 'meta.json')) as meta_file:
+            meta = json.load(meta_file)
+        self.channels = tuple(meta['channels'])
+        self.decimation = meta['decimation']
+        self.step_size = meta['step_size']
+        self.world_right = meta['world_right']
+        self.world_bottom = meta['world_bottom']
+        self.index = np.load(os.path.join(path, 'index.npy'))
+        self.columns = {}
+        if len(self.index) > 0:
+            for channel in self.channels:
+                self.columns[channel] = np.load(
+                    os.path.join(path, channel + '.npy'), mmap_mode='r')
+
+    def __len__(self):
+
+        return len(self.index)
+
+    def __getitem__(self, i):
+
+        if isinstance(i, slice):
+            return [ self[j] for j in range(*i.indices(len(self))) ]
+        if not np.isscalar(i):
+            return [ self[j] for j in np.arange(len(self))[i] ]
+
+        entry = self.index[i]
+        start = entry['offset']
+        stop = start + entry['num_samples']
+        trial = { channel: column[start:stop]
+                  for channel, column in self.columns.items() }
+        trial['time'] = np.arange(entry['num_samples']) \
+                        * (self.step_size * self.decimation)
+        trial['index'] = entry
+
+        return trial
+
+    def __iter__(self):
+
+        for i in range(len(self)):
+            yield self[i]
+
+    def find(self, presented_ball_size, comparison_ball_size):
+        """
+        Returns the indices of the trials with the given ball sizes
+        """
+
+        return np.nonzero(
+            (self.index['presented_size'] == presented_ball_size)
+            & (self.index['comparison_size'] == comparison_ball_size))[0]
+
+    def catch_fractions(self):
+        """
+        Returns the fraction of caught balls for each distinct pair of ball
+        sizes as (comparison_results, presented sizes, comparison sizes),
+        in the layout of RelationalCategorization.ordered_validation_run
+        and plot_catch_contour. Only the index is read.
+        """
+
+        presented_set, presented_index = np.unique(
+            self.index['presented_size'], return_inverse=True)
+        comparison_set, comparison_index = np.unique(
+            self.index['comparison_size'], return_inverse=True)
+        catches = np.zeros((comparison_set.shape[0], presented_set.shape[0]))
+        counts = np.zeros(catches.shape)
+        np.add.at(catches, (comparison_index, presented_index),
+                  self.index['catch'])
+        np.add.at(counts, (comparison_index, presented_index), 1)
+        with np.errstate(invalid='ignore'):
+            comparison_results = catches / counts
+
+        return comparison_results, presented_set, comparison_set
+
+def vpython_archive_visualization(archive, trial_index):
+    """
+    Replays a trial from a TrajectoryArchive that recorded the ball, agent
+    and rays. Requires VPython to run
+    """
+
+    from .relcat import vpython_replay
+
+    trial = archive[trial_index]
+    vpython_replay(archive.world_right, archive.world_bottom,
+                   trial['ball'], trial['agent'], trial['rays'])
+
+if __name__ == '__main__':
+    """
+    testing
+    """
+
+    pass
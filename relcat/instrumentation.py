@@ -0,0 +1,271 @@
+"""
+Module for opt-in counters and timers on the simulation hot paths.
+
+Instrumentation.enable replaces the instrumented methods with timed
+wrappers and disable puts the originals back, so nothing is measured, and
+nothing costs extra, while instrumentation is off.
+"""
+
+import inspect
+import json
+import time
+import numpy as np
+from . import batch_simulation
+from .relcat import RelationalCategorization
+from .sensor_agent import SensorAgent
+from .sensor_ctrnn import SensorCTRNN
+from .recorder import TrialRecorder
+from .batch_simulation import BatchSimulation
+from .visual_objects import Scene
+
+# Signatures of the callables whose arguments are counted, taken before
+# anything is instrumented
+_RAY_SENSORS_SIGNATURE = inspect.signature(SensorAgent.initialize_ray_sensors)
+_TRIAL_SIGNATURE = inspect.signature(RelationalCategorization.trial)
+_POPULATION_SIGNATURE = inspect.signature(
+                            RelationalCategorization.evaluate_population)
+_BATCH_SIGNATURE = inspect.signature(BatchSimulation.run)
+_INTERSECTIONS_SIGNATURE = inspect.signature(
+                            batch_simulation.circle_ray_intersections)
+
+def _bind(signature, args, kwargs):
+    """
+    Returns the arguments of a call by parameter name, however they were
+    passed. Signature.bind is only used for calls with keywords, as it
+    costs several microseconds per call.
+    """
+
+    if kwargs:
+        return signature.bind(*args, **kwargs).arguments
+    return dict(zip(signature.parameters, args))
+
+def _count_ray_sensors(args, kwargs):
+
+    # Called on every step, so positional calls skip _bind
+    if kwargs:
+        arguments = _bind(_RAY_SENSORS_SIGNATURE, args, kwargs)
+        agent = arguments['self']
+        visual_objects = (arguments['visual_obj'],
+                          arguments.get('visual_obj2'))
+    else:
+        agent = args[0]
+        visual_objects = args[1:]
+    num_objects = 0
+    for visual_obj in visual_objects:
+        if isinstance(visual_obj, Scene):
+            num_objects += len(visual_obj)
+        elif visual_obj is not None:
+            num_objects += 1
+
+    return {'ray_casting_steps': 1,
+            'intersection_tests': agent.num_of_rays * num_objects}
+
+def _count_trial(args, kwargs):
+
+    arguments = _bind(_TRIAL_SIGNATURE, args, kwargs)
+    task = arguments['self']
+
+    return {'trials': 1,
+            'locked_steps': task.ball_trajectory(
+                arguments['presented_ball_size']).shape[0],
+            'moving_steps': task.ball_trajectory(
+                arguments['comparison_ball_size']).shape[0]}
+
+def _count_population(args, kwargs):
+
+    arguments = _bind(_POPULATION_SIGNATURE, args, kwargs)
+
+    return {'evaluations': np.atleast_2d(arguments['X']).shape[0]}
+
+def _drop_steps(simulation, ball_sizes):
+    """
+    Returns the number of steps of dropping each of ball_sizes, summed
+    over the lanes of a BatchSimulation
+    """
+
+    sizes, counts = np.unique(np.asarray(ball_sizes, dtype=float),
+                              return_counts=True)
+
+    return int(sum(simulation.ball_trajectory(size).shape[0] * count
+                   for size, count in zip(sizes, counts)))
+
+def _count_batch(args, kwargs):
+
+    arguments = _bind(_BATCH_SIGNATURE, args, kwargs)
+    simulation = arguments['self']
+
+    return {'trials': len(arguments['presented_sizes']),
+            'locked_steps': _drop_steps(simulation,
+                                        arguments['presented_sizes']),
+            'moving_steps': _drop_steps(simulation,
+                                        arguments['comparison_sizes'])}
+
+def _count_batch_intersections(args, kwargs):
+
+    # Called on every batched step, so positional calls skip _bind
+    if kwargs:
+        return {'intersection_tests': np.size(_bind(_INTERSECTIONS_SIGNATURE,
+                                                    args, kwargs)['x2'])}
+
+    return {'intersection_tests': np.size(args[2])}
+
+# (owner, attribute, subsystem, counter function) of every instrumented
+# callable. Times are exclusive, time spent in an instrumented callee is
+# only counted towards the callee's subsystem.
+INSTRUMENTED = [
+    (SensorAgent, 'initialize_ray_sensors', 'ray_casting',
+        _count_ray_sensors),
+    (batch_simulation, 'circle_ray_intersections', 'ray_casting',
+        _count_batch_intersections),
+    (SensorCTRNN, 'step', 'ctrnn', lambda args, kwargs: {'ctrnn_steps': 1}),
+    (SensorAgent, 'step', 'physics', None),
+    (SensorAgent, 'clip_position', 'physics', None),
+    (TrialRecorder, 'start', 'recording', None),
+    (TrialRecorder, 'record', 'recording', None),
+    (RelationalCategorization, 'map_search_parameters', 'parameter_mapping',
+        None),
+    (RelationalCategorization, 'decode_population', 'parameter_mapping',
+        None),
+    (RelationalCategorization, 'trial', 'trial', _count_trial),
+    (BatchSimulation, 'run', 'batch_simulation', _count_batch),
+    (RelationalCategorization, '__call__', 'evaluation',
+        lambda args, kwargs: {'evaluations': 1}),
+    (RelationalCategorization, 'evaluate_population', 'evaluation',
+        _count_population)]
+
+# The instance that is currently enabled
+_active = None
+
+class Instrumentation:
+    """
+    Counts steps per phase, intersection tests, trials and evaluations,
+    and times each subsystem: ray casting, CTRNN integration, physics,
+    recording, parameter mapping, the rest of trial, batched simulation
+    and the rest of evaluation. Batched runs count the steps of all of
+    their lanes, as serial trials would.
+
+    Use as a context manager, or call enable and disable. Only one
+    instance can be enabled at a time. Only the calling process is
+    measured, not the workers of a PoolEvaluator.
+
+    """
+
+    def __init__(self):
+
+        self._originals = []
+        self._stack = []
+        self.reset()
+
+    def reset(self):
+        """
+        Clears the counters and timers, for example between evaluations
+        """
+
+        self.counters = {}
+        self.times = {}
+        self.evaluation_time = 0.0
+        del self._stack[:]
+        self._start_time = time.perf_counter()
+
+    def enable(self):
+
+        global _active
+        if _active is self:
+            return self
+        if _active is not None:
+            raise RuntimeError("Error: another Instrumentation is enabled")
+
+        for owner, attribute, subsystem, count in INSTRUMENTED:
+            original = owner.__dict__[attribute]
+            self._originals.append((owner, attribute, original))
+            setattr(owner, attribute, self._wrap(original, subsystem, count))
+        _active = self
+        self.reset()
+
+        return self
+
+    def disable(self):
+
+        global _active
+        for owner, attribute, original in reversed(self._originals):
+            setattr(owner, attribute, original)
+        self._originals = []
+        if _active is self:
+            _active = None
+
+    def __enter__(self):
+
+        return self.enable()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        self.disable()
+
+    def _wrap(self, function, subsystem, count):
+
+        stack = self._stack
+        perf_counter = time.perf_counter
+
+        def wrapper(*args, **kwargs):
+            if count is not None:
+                for key, value in count(args, kwargs).items():
+                    self.counters[key] = self.counters.get(key, 0) + value
+
+            stack.append(0.0)
+            start = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = perf_counter() - start
+                child_time = stack.pop()
+                self.times[subsystem] = self.times.get(subsystem, 0.0) \
+                                        + elapsed - child_time
+                if stack:
+                    stack[-1] += elapsed
+                elif subsystem == 'evaluation':
+                    self.evaluation_time += elapsed
+
+        wrapper.__wrapped__ = function
+        wrapper.__name__ = getattr(function, '__name__', 'wrapper')
+        wrapper.__doc__ = function.__doc__
+
+        return wrapper
+
+    def summary(self):
+        """
+        Returns the counters, the exclusive time of each subsystem, and
+        the evaluation and trial rates since the last reset as a dict
+        """
+
+        evaluations = self.counters.get('evaluations', 0)
+        trials = self.counters.get('trials', 0)
+        rates = {}
+        if self.evaluation_time > 0:
+            rates['evaluations_per_sec'] = evaluations / self.evaluation_time
+            rates['trials_per_sec'] = trials / self.evaluation_time
+
+        return {'counters': dict(self.counters),
+                'times': dict(self.times),
+                'evaluation_time': self.evaluation_time,
+                'wall_time': time.perf_counter() - self._start_time,
+                'rates': rates}
+
+    def to_json(self, path=None):
+        """
+        Returns the summary as a JSON string, and writes it to path if
+        one is given
+        """
+
+        text = json.dumps(self.summary(), indent=2, sort_keys=True)
+        if path is not None:
+            with open(path, 'w') as json_file:
+                json_file.write(text)
+
+        return text
+
+if __name__ == '__main__':
+    """
+    testing
+    """
+
+    pass
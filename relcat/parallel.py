@@ -0,0 +1,283 @@
+"""
+Module for evaluating the relational categorization task on a pool of
+worker processes. Each worker builds its own task from the parameter dict
+once, after which only genome arrays and fitness values cross the process
+boundary. With shared memory even those stay put, and only the names of
+the shared blocks and row indices are sent.
+"""
+
+import numpy as np
+import math
+import os
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from .relcat import RelationalCategorization
+
+# The task instance resident in a worker process, see _initialize_worker
+_worker_task = None
+
+def _initialize_worker(parameters):
+
+    global _worker_task
+    _worker_task = RelationalCategorization(**parameters)
+
+def _call_worker_task(method_name, *args, **kwargs):
+    """
+    Calls a method of the worker's resident task
+    """
+
+    return getattr(_worker_task, method_name)(*args, **kwargs)
+
+def _read_shared_rows(block, start, stop):
+    """
+    Returns a copy of rows start:stop of a shared array, block is its
+    (name, shape, dtype)
+    """
+
+    name, shape, dtype = block
+    memory = shared_memory.SharedMemory(name=name)
+    try:
+        return np.ndarray(shape, dtype, buffer=memory.buf)[start:stop].copy()
+    finally:
+        memory.close()
+
+def _write_shared_rows(block, start, stop, values):
+
+    name, shape, dtype = block
+    memory = shared_memory.SharedMemory(name=name)
+    try:
+        np.ndarray(shape, dtype, buffer=memory.buf)[start:stop] = values
+    finally:
+        memory.close()
+
+def _call_worker_task_shared(method_name, inputs, outputs, start, stop,
+    *args):
+    """
+    Calls a method of the worker's resident task on rows start:stop of the
+    shared inputs array, and writes the result into the same rows of the
+    shared outputs array
+    """
+
+    _write_shared_rows(outputs, start, stop,
+        getattr(_worker_task, method_name)(
+            _read_shared_rows(inputs, start, stop), *args))
+
+class PoolEvaluator:
+    """
+    Evaluates genomes with a persistent pool of worker processes.
+
+    The pool is started once and reused between calls. A population is
+    split into chunks which the workers evaluate with
+    RelationalCategorization.evaluate_population. If a worker dies the pool
+    is restarted and the unfinished chunks are resubmitted, up to
+    max_restarts times per call.
+
+    With use_shared_memory the population and the results are kept in
+    multiprocessing.shared_memory blocks, which the workers read their rows
+    from and write their results into, instead of pickling them.
+
+    Use as a context manager or call close() to shut the workers down.
+
+    """
+
+    def __init__(self, task=None, num_workers=None, chunk_size=None,
+        max_restarts=1, use_shared_memory=False, **kwargs):
+        """
+        task : a RelationalCategorization whose parameters the workers copy,
+            if None one is built from kwargs. Its fitness cache, if it has
+            one, is used by map
+        num_workers : number of processes, defaults to os.cpu_count()
+        chunk_size : genomes per job, defaults to splitting each population
+            evenly between the workers
+        use_shared_memory : if True, populations and results are passed
+            through shared memory, see map_rows
+        """
+
+        if task is None:
+            task = RelationalCategorization(**kwargs)
+
+        # The fitness cache is kept by the task in this process, so that
+        # repeated genomes are never sent to the workers
+        self.task = task
+        self.parameters = task.parameters()
+        self.parameters['fitness_cache_size'] = 0
+        self.num_parameters = task.num_parameters
+        if num_workers is None:
+            num_workers = os.cpu_count()
+        self.num_workers = num_workers
+        self.chunk_size = chunk_size
+        self.max_restarts = max_restarts
+        self.use_shared_memory = use_shared_memory
+        self.executor = None
+        self.start()
+
+    def start(self):
+
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.num_workers,
+                initializer=_initialize_worker, initargs=(self.parameters,))
+
+    def close(self):
+
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+    def restart(self):
+
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+        self.start()
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        self.close()
+
+    def __call__(self, x):
+        """
+        Returns the cost of a single genome, as RelationalCategorization
+        """
+
+        return self.map(np.asarray(x)[None, :])[0]
+
+    def map(self, X):
+        """
+        X : (N, num_parameters) array of search parameter values
+
+        Returns the costs of all N genomes. Genomes found in the fitness
+        cache of the task are not evaluated again.
+        """
+
+        X = np.atleast_2d(np.asarray(X, dtype=float))
+        if X.shape[1] != self.num_parameters:
+            raise ValueError("Error: genomes have " + str(X.shape[1])
+                + " parameters, the task expects "
+                + str(self.num_parameters))
+
+        if self.task.caching_fitness():
+            return self.task.cached_costs(X, self._map)
+
+        return self._map(X)
+
+    def _map(self, X):
+
+        return self.map_rows('evaluate_population', X)
+
+    def map_validation_grids(self, X, num_sizes=20, num_trials=1):
+        """
+        X : (N, num_parameters) array of search parameter values
+
+        Returns the (N, num_sizes, num_sizes) catch fractions of every
+        genome, see RelationalCategorization.ordered_validation_grids.
+        """
+
+        X = np.atleast_2d(np.asarray(X, dtype=float))
+        return self.map_rows('ordered_validation_grids', X,
+                             (num_sizes, num_sizes), (num_sizes, num_trials))
+
+    def map_rows(self, method_name, X, result_shape=(), args=()):
+        """
+        Splits the rows of X into chunks, calls the method of the workers'
+        tasks on each chunk with the extra args, and returns the stacked
+        results, an array of shape (N,) + result_shape.
+
+        With use_shared_memory, X is copied once into a shared block and
+        the workers write their results straight into a shared block of
+        the result shape, so only the block names and the row indices of
+        each chunk are pickled.
+        """
+
+        chunk_size = self.chunk_size
+        if chunk_size is None:
+            chunk_size = max(1, math.ceil(X.shape[0] / self.num_workers))
+        chunks = [ slice(start, start + chunk_size)
+                   for start in range(0, X.shape[0], chunk_size) ]
+        results = np.zeros((X.shape[0],) + tuple(result_shape))
+
+        if not self.use_shared_memory or X.shape[0] == 0:
+            for chunk, result in zip(chunks, self.run_jobs(
+                    [ (method_name, (X[chunk],) + tuple(args))
+                      for chunk in chunks ])):
+                results[chunk] = result
+
+            return results
+
+        input_memory = shared_memory.SharedMemory(create=True,
+                                                  size=X.nbytes)
+        output_memory = shared_memory.SharedMemory(create=True,
+                                                   size=results.nbytes)
+        try:
+            np.ndarray(X.shape, X.dtype, buffer=input_memory.buf)[:] = X
+            inputs = (input_memory.name, X.shape, X.dtype.str)
+            outputs = (output_memory.name, results.shape, results.dtype.str)
+            self.run_jobs([ (method_name, (inputs, outputs, chunk.start,
+                                           chunk.stop) + tuple(args))
+                            for chunk in chunks ],
+                          function=_call_worker_task_shared)
+            results[:] = np.ndarray(results.shape, results.dtype,
+                                    buffer=output_memory.buf)
+
+        finally:
+            input_memory.close()
+            input_memory.unlink()
+            output_memory.close()
+            output_memory.unlink()
+
+        return results
+
+    def run_jobs(self, jobs, function=_call_worker_task):
+        """
+        jobs : list of (method name, args) pairs called on the workers'
+            resident tasks
+        function : the worker function that is called with the method name
+            and args of each job
+
+        Returns the results in the order of the jobs. Exceptions raised by
+        the task are passed on, a lost worker restarts the pool.
+        """
+
+        results = [None] * len(jobs)
+        pending = list(range(len(jobs)))
+        restarts = 0
+        while pending:
+            self.start()
+            futures = {}
+            try:
+                for i in pending:
+                    method_name, args = jobs[i]
+                    futures[i] = self.executor.submit(function, method_name,
+                                                      *args)
+                for i in pending:
+                    results[i] = futures[i].result()
+                pending = []
+
+            except BrokenProcessPool:
+                if restarts >= self.max_restarts:
+                    self.close()
+                    raise RuntimeError("Error: worker pool failed "
+                        + str(restarts + 1) + " times")
+                restarts += 1
+
+                # Keep the results of jobs that finished before the failure
+                finished = [ i for i, future in futures.items()
+                             if future.done() and not future.cancelled()
+                             and future.exception() is None ]
+                for i in finished:
+                    results[i] = futures[i].result()
+                pending = [ i for i in pending if i not in finished ]
+                self.restart()
+
+        return results
+
+if __name__ == '__main__':
+    """
+    testing
+    """
+
+    pass
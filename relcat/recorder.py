@@ -0,0 +1,123 @@
+"""
+Module for recording the state of the simulation during a trial into
+preallocated arrays.
+"""
+
+import numpy as np
+
+# Channels a TrialRecorder can record
+CHANNELS = ('ball', 'agent', 'rays', 'sensors', 'states', 'outputs')
+
+class TrialRecorder:
+    """
+    Records a selection of channels every decimation steps of a trial.
+
+    ball : (num_samples, 3) x, y and radius of the ball
+    agent : (num_samples, 3) x, y and radius of the agent
+    rays : (num_samples, num_rays, 4) x1, y1, x2 and y2 of every ray
+    sensors : (num_samples, num_rays) sensor states
+    states : (num_samples, circuit_size) neuron states
+    outputs : (num_samples, circuit_size) neuron outputs
+
+    Channels that are not recorded are None. The first sample is the state
+    before the first step, time holds the time of each sample.
+
+    """
+
+    def __init__(self, channels=('ball', 'agent', 'rays'), decimation=1):
+
+        for channel in channels:
+            if channel not in CHANNELS:
+                raise ValueError("Error: unknown channel " + str(channel))
+        if decimation < 1:
+            raise ValueError("Error: decimation must be at least 1")
+
+        self.channels = tuple(channels)
+        self.decimation = decimation
+        self.num_samples = 0
+        self.time = np.zeros(0)
+        for channel in CHANNELS:
+            setattr(self, channel, None)
+
+    def start(self, agent, ball, num_steps, step_size):
+        """
+        Allocates the arrays for a trial of num_steps steps and records
+        the initial state
+        """
+
+        num_samples = num_steps // self.decimation + 1
+        num_rays = len(agent.rays)
+        circuit_size = agent.nervous_system.circuit_size
+        shapes = {'ball': (num_samples, 3),
+                  'agent': (num_samples, 3),
+                  'rays': (num_samples, num_rays, 4),
+                  'sensors': (num_samples, num_rays),
+                  'states': (num_samples, circuit_size),
+                  'outputs': (num_samples, circuit_size)}
+        for channel in self.channels:
+            setattr(self, channel, np.zeros(shapes[channel]))
+
+        self.time = np.arange(num_samples) * (step_size * self.decimation)
+        self.num_samples = 0
+        self._step = 0
+        self._sample(agent, ball)
+
+    def record(self, agent, ball):
+        """
+        Called after every step of the trial
+        """
+
+        self._step += 1
+        if self._step % self.decimation == 0:
+            self._sample(agent, ball)
+
+    def _sample(self, agent, ball):
+
+        i = self.num_samples
+        if self.ball is not None:
+            self.ball[i] = (ball.center_xpos, ball.center_ypos, ball.size)
+        if self.agent is not None:
+            self.agent[i] = (agent.xpos, agent.ypos, agent.radius)
+        if self.rays is not None:
+            rays = agent.rays
+            self.rays[i, :, 0] = rays.x1
+            self.rays[i, :, 1] = rays.y1
+            self.rays[i, :, 2] = rays.x2
+            self.rays[i, :, 3] = rays.y2
+        if self.sensors is not None:
+            self.sensors[i] = agent.nervous_system.sensor_states[:, 0]
+        if self.states is not None:
+            self.states[i] = agent.nervous_system.ctrnn_states[:, 0]
+        if self.outputs is not None:
+            self.outputs[i] = agent.nervous_system.ctrnn_outputs[:, 0]
+        self.num_samples += 1
+
+    def object_records(self):
+        """
+        Returns the ball, agent and ray channels in the layout of
+        RelationalCategorization.object_records, with arrays in place of
+        lists.
+        """
+
+        records = {}
+        if self.ball is not None:
+            records['ball'] = {'x': self.ball[:, 0], 'y': self.ball[:, 1],
+                               'radius': self.ball[:, 2]}
+        if self.agent is not None:
+            records['agent'] = {'x': self.agent[:, 0], 'y': self.agent[:, 1],
+                                'radius': self.agent[:, 2]}
+        if self.rays is not None:
+            for i in range(self.rays.shape[1]):
+                records[i] = {'x1': self.rays[:, i, 0],
+                              'y1': self.rays[:, i, 1],
+                              'x2': self.rays[:, i, 2],
+                              'y2': self.rays[:, i, 3]}
+
+        return records
+
+if __name__ == '__main__':
+    """
+    testing
+    """
+
+    pass
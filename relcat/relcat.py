@@ -1,14 +1,117 @@
 """
 Main module for running the relational categorization task.
 Contains the class for creating a simulation.
+
+Only numpy is needed to run the task. matplotlib and vpython are imported
+by the plotting and visualization functions when they are first called.
 """
 
 import numpy as np
 import math
-import matplotlib.pyplot as plt
-import matplotlib.cm as cm
+from collections import OrderedDict
 from .sensor_agent import SensorAgent
+from .sensor_ctrnn import spawn_seed
 from .visual_objects import Circle
+from .visual_objects import RayBundle
+from .visual_objects import circle_ray_intersections
+from .batch_simulation import BatchSimulation
+from .recorder import TrialRecorder
+
+class FitnessBound(float):
+    """
+    Returned instead of the exact fitness or cost when an evaluation was
+    abandoned early. Its value is the best the genome could still have
+    reached, an upper bound on the fitness or a lower bound on the cost.
+    """
+
+    __slots__ = ()
+
+    def __repr__(self):
+
+        return 'FitnessBound(' + float.__repr__(self) + ')'
+
+class FitnessCache:
+    """
+    Bounded least recently used map from genome keys to costs, with counts
+    of hits, misses and evictions. See RelationalCategorization.genome_keys.
+    """
+
+    def __init__(self, max_size):
+
+        if max_size < 1:
+            raise ValueError("Error: cache size must be at least 1")
+
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+
+        return len(self.entries)
+
+    def get(self, key):
+        """
+        Returns the cost stored under key, or None on a miss
+        """
+
+        cost = self.entries.get(key)
+        if cost is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+
+        return cost
+
+    def put(self, key, cost):
+
+        self.entries[key] = cost
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self, reset_counts=True):
+
+        self.entries.clear()
+        if reset_counts:
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def info(self):
+
+        return {'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'size': len(self.entries),
+                'max_size': self.max_size}
+
+class TrialSnapshot:
+    """
+    State of a streamed trial after a step, see
+    RelationalCategorization.stream_trial. rays, sensors, states and
+    outputs are views of the agent's arrays that change as the trial goes
+    on, copy them to keep them.
+    """
+
+    __slots__ = ('step', 'time', 'locked', 'ball_x', 'ball_y', 'ball_radius',
+                 'agent_x', 'agent_y', 'rays', 'sensors', 'states', 'outputs')
+
+    def __init__(self, step, step_size, locked, agent, ball):
+
+        self.step = step
+        self.time = step * step_size
+        self.locked = locked
+        self.ball_x = ball.center_xpos
+        self.ball_y = ball.center_ypos
+        self.ball_radius = ball.size
+        self.agent_x = agent.xpos
+        self.agent_y = agent.ypos
+        self.rays = agent.rays
+        self.sensors = agent.nervous_system.sensor_states[:, 0]
+        self.states = agent.nervous_system.ctrnn_states[:, 0]
+        self.outputs = agent.nervous_system.ctrnn_outputs[:, 0]
 
 class RelationalCategorization:
 
@@ -40,6 +143,41 @@ class RelationalCategorization:
         max_bias
         min_tau
         max_tau
+        noise_strength
+        batch_trials : if True, run_trials and the validation runs simulate
+            all of their trials in lockstep with a BatchSimulation
+        seed : seed of the noise streams and random ball sizes of each
+            evaluation. Every trial gets its own stream spawned from it, so
+            serial and batched runs see the same noise, and their costs
+            agree to within a couple of ulps, see BatchSimulation. None
+            draws fresh entropy for every evaluation
+        racing_rounds : number of batches the trials are split into when
+            batch_trials is used with a threshold, see run_trials. At least
+            1, and at most one batch per trial is used
+        integrator : method used to step the nervous system, one of
+            'euler', 'exponential' or 'rk4', see SensorCTRNN. Measured
+            with benchmarks/integrators.py against the Euler reference at
+            a step_size of 0.1, on the fittest 20 of 200 and 5 of 50
+            random genomes: step sizes of 0.2 to 0.5 with the exponential
+            or rk4 integrator keep the task fitness within 0.01, and change
+            up to 0.5% and 1.8% of the catch/avoid outcomes of an ordered
+            validation run on the two samples. Plain Euler at step sizes
+            of 0.2 and 0.3 is as accurate, within 0.0061 and changing up
+            to 1.6% of the outcomes
+        fitness_cache_size : if above 0, __call__ and evaluate_population
+            keep the costs of up to this many distinct genomes in a least
+            recently used cache. Only used while noise_strength is 0, as
+            noisy costs differ between evaluations
+        fitness_cache_decimals : if given, decoded parameters are rounded to
+            this many decimals before they are compared, so genomes closer
+            than that share a cached cost. None only matches genomes that
+            decode to exactly the same network
+        dtype : floating point type of the simulation, 'float64' or
+            'float32'. The nervous system, rays and the arrays of a
+            BatchSimulation all use it. Against float64, float32 keeps the
+            task fitness within 2e-4 and changed none of the catch/avoid
+            outcomes of an ordered validation run, while batched evaluation
+            runs about 1.4 times faster, see benchmarks/float32.py
 
         """
 
@@ -72,17 +210,35 @@ class RelationalCategorization:
         'max_tau': 30.,
         'min_search_value': 0.0,
         'max_search_value': 1.0,
-        'noise_strength': 0.0
+        'noise_strength': 0.0,
+        'batch_trials': False,
+        'seed': None,
+        'racing_rounds': 5,
+        'integrator': 'euler',
+        'fitness_cache_size': 0,
+        'fitness_cache_decimals': None,
+        'dtype': 'float64'
         }
 
         for key, default in parameter_defaults.items():
             setattr(self, key, kwargs.get(key, default))
+        self.parameter_names = tuple(parameter_defaults)
+        if np.dtype(self.dtype) not in (np.float64, np.float32):
+            raise ValueError("Error: dtype must be float64 or float32")
+        if self.racing_rounds < 1:
+            raise ValueError("Error: racing_rounds must be at least 1")
 
         self.circuit_size = self.num_interneurons + 2
         self.initial_agent_x = (self.world_right - self.world_left) / 2.
         self.initial_agent_y = self.world_bottom - self.agent_radius
         self.agent_top = self.initial_agent_y + self.agent_radius
         self.vertical_offset = self.agent_top - self.max_ray_length
+        self._cache_key = None
+        self._cache = OrderedDict()
+        self.fitness_cache = None
+        self._fitness_cache_key = None
+        if self.fitness_cache_size > 0:
+            self.fitness_cache = FitnessCache(self.fitness_cache_size)
         if self.bilateral_symmetry:
             if self.num_rays % 2 == 0:
                 self.num_sensor_weights = int(self.num_rays / 2
@@ -119,13 +275,36 @@ class RelationalCategorization:
                 + self.num_interneurons + 2 \
                 + self.num_interneurons + 2
 
-    def __call__(self, x):
+        self._compile_decoder()
+
+    def __call__(self, x, threshold=None):
+        """
+        Returns the cost of genome x. If a threshold cost is given the
+        evaluation is abandoned once the genome can no longer get a cost
+        below it, and a FitnessBound with the lowest cost it could still
+        have reached is returned instead.
+        """
+
+        if self.caching_fitness():
+            key = self.genome_keys(np.asarray(x)[None, :])[0]
+            cost = self.fitness_cache.get(key)
+            if cost is None:
+                cost = self._evaluate(x, threshold)
+                # Abandoned evaluations have no exact cost to keep
+                if not isinstance(cost, FitnessBound):
+                    self.fitness_cache.put(key, cost)
+            return cost
+
+        return self._evaluate(x, threshold)
+
+    def _evaluate(self, x, threshold=None):
 
         # Generate agent
         agent = SensorAgent(self.agent_radius,
             self.mass, self.visual_angle, self.num_rays,
             self.max_ray_length, self.initial_agent_x, self.initial_agent_y,
-            self.circuit_size, self.max_velocity, noise_strength=self.noise_strength)
+            self.circuit_size, self.max_velocity, noise_strength=self.noise_strength,
+            integrator=self.integrator, dtype=self.dtype)
 
         # Generate circle
         ball = Circle(self.circle_size,
@@ -136,277 +315,566 @@ class RelationalCategorization:
         self.map_search_parameters(x, agent.nervous_system)
 
         # Run trials
-        fitness = self.run_trials(agent, ball)
+        if threshold is None:
+            fitness = self.run_trials(agent, ball)
+        else:
+            fitness = self.run_trials(agent, ball, -threshold)
 
         # Convert to cost
+        if isinstance(fitness, FitnessBound):
+            return FitnessBound(-fitness)
         return -fitness
 
-    def map_search_parameters(self, x, nervous_system):
+    def parameters(self):
         """
-        x : numpy array of search parameter values
+        Returns the task's parameters as a dict, so an identical task can be
+        built with RelationalCategorization(**task.parameters())
+        """
+
+        return { key: getattr(self, key) for key in self.parameter_names }
+
+    def __getstate__(self):
+        """
+        Leaves the geometry tables, cached costs and the records of the
+        last recorded trial out of pickles, as the task is pickled for
+        every job sent to worker processes
+        """
+
+        state = self.__dict__.copy()
+        for name in _UNPICKLED_ATTRIBUTES:
+            state.pop(name, None)
+        if self.fitness_cache is not None:
+            state['fitness_cache'] = FitnessCache(self.fitness_cache.max_size)
+        state['_fitness_cache_key'] = None
+
+        return state
+
+    def __setstate__(self, state):
+
+        self.__dict__.update(state)
+        self._cache_key = None
+        self._cache = OrderedDict()
+
+    def evaluate_population(self, X):
+        """
+        X : (N, num_parameters) array of search parameter values
+
+        Returns the costs of all N genomes, as __call__ would for each row.
+        All agents and trials are advanced together by a BatchSimulation.
+        """
+
+        X = np.atleast_2d(X)
+        if X.shape[0] == 0:
+            return np.zeros(0)
+        if self.caching_fitness():
+            return self.cached_costs(X, self._evaluate_population)
+
+        return self._evaluate_population(X)
+
+    def _evaluate_population(self, X):
+
+        num_genomes = X.shape[0]
+        sensor_weights, circuit_weights, biases, time_constants = \
+            self.decode_population(X)
+
+        rows, cols, presented_sizes, comparison_sizes = self._trial_grid()
+        num_pairs = rows.shape[0]
+        genomes = np.repeat(np.arange(num_genomes), num_pairs)
+
+        noise_seeds = []
+        for i in range(num_genomes):
+            noise_seeds += self.trial_seeds(num_pairs)
+
+        fitness = BatchSimulation(self).run(sensor_weights[genomes],
+            circuit_weights[genomes], biases[genomes],
+            1. / time_constants[genomes],
+            np.tile(presented_sizes, num_genomes),
+            np.tile(comparison_sizes, num_genomes),
+            noise_seeds=noise_seeds)
+
+        num_sizes = int(self.circle_max_diameter / self.circle_difference)
+        result_matrices = np.zeros((num_genomes, num_sizes, num_sizes))
+        result_matrices[:, rows, cols] = fitness.reshape(num_genomes,
+                                                         num_pairs)
+
+        return -np.array([ self.eval_fitness(result_matrix)
+                           for result_matrix in result_matrices ])
+
+    def decode_population(self, X):
+        """
+        X : (N, num_parameters) array of search parameter values
+
+        Returns stacked sensor weights (N, num_rays, circuit_size), circuit
+        weights (N, circuit_size, circuit_size), biases (N, circuit_size)
+        and time constants (N, circuit_size), starting from the values of
+        a new SensorCTRNN.
+        """
+
+        X = np.atleast_2d(X)
+        values = self.decode_parameters(X)
+        decoded = { 'sensor_weights': np.zeros((X.shape[0], self.num_rays,
+                                                self.circuit_size)),
+                    'circuit_weights': np.zeros((X.shape[0],
+                                        self.circuit_size, self.circuit_size)),
+                    'biases': np.zeros((X.shape[0], self.circuit_size)),
+                    'time_constants': np.ones((X.shape[0], self.circuit_size))}
+        for name, (targets, sources) in self._decoder_maps.items():
+            decoded[name][(slice(None),) + targets] = values[:, sources]
+
+        return decoded['sensor_weights'], decoded['circuit_weights'], \
+            decoded['biases'], decoded['time_constants']
+
+    def caching_fitness(self):
+        """
+        Whether costs are looked up in and stored to the fitness cache. The
+        cached costs are dropped whenever one of the parameters they depend
+        on has changed since the last call.
+        """
+
+        if self.fitness_cache is None or self.noise_strength != 0.0:
+            return False
+
+        key = tuple(getattr(self, name) for name in self.parameter_names
+                    if name not in _FITNESS_CACHE_EXEMPT)
+        if self._fitness_cache_key != key:
+            self._fitness_cache_key = key
+            self.fitness_cache.clear(reset_counts=False)
+
+        return True
+
+    def genome_keys(self, X):
+        """
+        X : (N, num_parameters) array of search parameter values
+
+        Returns a bytes key for each genome. Keys are built from the decoded
+        network rather than the raw genome, so genomes that periodic
+        boundary conditions or unused parameters make equivalent share a
+        key. Values are rounded to fitness_cache_decimals if it is set, and
+        negative zeros are made positive.
+        """
+
+        decoded = np.concatenate([ values.reshape(X.shape[0], -1)
+                                   for values in self.decode_population(X) ],
+                                 axis=1)
+        if self.fitness_cache_decimals is not None:
+            decoded = np.round(decoded, self.fitness_cache_decimals)
+        decoded += 0.0
+
+        return [ row.tobytes() for row in decoded ]
+
+    def cached_costs(self, X, evaluate):
+        """
+        X : (N, num_parameters) array of search parameter values
+        evaluate : function returning the costs of an array of genomes
+
+        Returns the costs of all N genomes, looking each one up in the
+        fitness cache. Only the first of each distinct missing genome is
+        passed on to evaluate, and its cost is then stored in the cache.
+        """
+
+        keys = self.genome_keys(X)
+        costs = np.zeros(X.shape[0])
+        missing = {}
+        for i, key in enumerate(keys):
+            if key in missing:
+                # Duplicate of a genome that is already being evaluated
+                self.fitness_cache.hits += 1
+                missing[key].append(i)
+                continue
+
+            cost = self.fitness_cache.get(key)
+            if cost is None:
+                missing[key] = [i]
+            else:
+                costs[i] = cost
+
+        if missing:
+            rows = [ indices[0] for indices in missing.values() ]
+            for key, cost in zip(missing, evaluate(X[rows])):
+                costs[missing[key]] = cost
+                self.fitness_cache.put(key, float(cost))
+
+        return costs
+
+    def trial_seeds(self, num_trials):
+        """
+        Returns a numpy SeedSequence for each of num_trials trials of one
+        evaluation, spawned from the task's seed. Without noise there is
+        nothing to seed and a list of None is returned.
         """
 
+        if self.noise_strength == 0.0:
+            return [None] * num_trials
+
+        evaluation_seed = np.random.SeedSequence(self.seed)
+        return [ spawn_seed(evaluation_seed, i) for i in range(num_trials) ]
+
+    def _trial_grid(self):
+        """
+        Returns the result matrix indices (rows, cols) and the presented
+        and comparison ball sizes of every trial run by run_trials.
+        """
+
+        num_sizes = int(self.circle_max_diameter / self.circle_difference)
+        rows, cols = np.nonzero(~np.eye(num_sizes, dtype=bool))
+        presented_sizes = rows * self.circle_difference \
+                            + self.circle_min_diameter
+        comparison_sizes = cols * self.circle_difference \
+                            + self.circle_min_diameter
+
+        return rows, cols, presented_sizes, comparison_sizes
+
+    def _compile_decoder(self):
+        """
+        Works out once which search parameter each sensor weight, circuit
+        weight, bias and time constant is read from, along with the scale
+        and offset that rescale each search parameter. Targets that are
+        written more than once keep the last assignment.
+        """
+
+        sensor_index_end = self.num_sensor_weights
+        circuit_index_end = sensor_index_end + self.num_circuit_weights
+        sensor_weights = {}
+        circuit_weights = {}
+        biases = {}
+        time_constants = {}
 
         if self.bilateral_symmetry:
 
-            sensor_index_end = self.num_sensor_weights
-            circuit_index_end = sensor_index_end + self.num_circuit_weights
             bias_index_end = circuit_index_end \
                                 + math.ceil(self.circuit_size / 2)
 
             # Sensor Weights
-            sensor_weights = rescale_parameter(periodic_boundary_conditions(
-                x[:sensor_index_end], 1), 
-                self.min_weight,
-                self.max_weight, self.min_search_value,
-                self.max_search_value)
             index_counter = 0
             for i in range(int(self.num_rays / 2)):
                 for j in range(self.num_interneurons):
-                    nervous_system.sensor_weights[i,j] = \
-                        sensor_weights[index_counter]
-                    nervous_system.sensor_weights[self.num_rays - i - 1, 
-                        self.num_interneurons - j - 1] = \
-                        sensor_weights[index_counter]
+                    sensor_weights[i, j] = index_counter
+                    sensor_weights[self.num_rays - i - 1,
+                        self.num_interneurons - j - 1] = index_counter
                     index_counter += 1
 
             if self.num_rays % 2 == 1:
                 for j in range(math.ceil(self.num_interneurons / 2)):
-                    nervous_system.sensor_weights[int(self.num_rays 
-                        / 2), j] = sensor_weights[index_counter]
-                    nervous_system.sensor_weights[int(self.num_rays 
-                        / 2), self.num_interneurons - j - 1] \
-                                = sensor_weights[index_counter]
+                    sensor_weights[int(self.num_rays / 2), j] = index_counter
+                    sensor_weights[int(self.num_rays / 2),
+                        self.num_interneurons - j - 1] = index_counter
                     index_counter += 1
 
-            # index_counter == sensor_index_end when over
-
             # Circuit weights
-            circuit_weights = rescale_parameter(periodic_boundary_conditions(\
-                x[sensor_index_end:circuit_index_end],1), 
-                self.min_weight,
-                self.max_weight, self.min_search_value,
-                self.max_search_value)
-
-            index_counter = 0
+            index_counter = sensor_index_end
             for i in range(int(self.num_interneurons / 2)):
                 for j in range(self.num_interneurons):
-                    nervous_system.circuit_weights[i,j] = \
-                        circuit_weights[index_counter]
-                    nervous_system.circuit_weights[self.num_interneurons 
-                        - i - 1, self.num_interneurons - j - 1] = \
-                        circuit_weights[index_counter]
+                    circuit_weights[i, j] = index_counter
+                    circuit_weights[self.num_interneurons - i - 1,
+                        self.num_interneurons - j - 1] = index_counter
                     index_counter += 1
 
             if self.num_interneurons % 2 == 1:
                 for j in range(math.ceil(self.num_interneurons / 2)):
-                    nervous_system.circuit_weights[int(\
-                        self.num_interneurons / 2), j] \
-                        = circuit_weights[index_counter]
-                    nervous_system.circuit_weights[int(\
-                        self.num_interneurons / 2), 
-                        self.num_interneurons - j - 1] \
-                        = circuit_weights[index_counter]
+                    circuit_weights[int(self.num_interneurons / 2), j] \
+                        = index_counter
+                    circuit_weights[int(self.num_interneurons / 2),
+                        self.num_interneurons - j - 1] = index_counter
                     index_counter += 1
 
             for i in range(int(self.num_interneurons / 2)):
                 for j in range(2):
-                    nervous_system.circuit_weights[i, 
-                        self.num_interneurons + j] \
-                        = circuit_weights[index_counter]
-                    nervous_system.circuit_weights[self.num_interneurons \
-                        - i - 1, self.circuit_size - j - 1] \
-                        = circuit_weights[index_counter]
+                    circuit_weights[i, self.num_interneurons + j] \
+                        = index_counter
+                    circuit_weights[self.num_interneurons - i - 1,
+                        self.circuit_size - j - 1] = index_counter
                     index_counter += 1
 
             if self.num_interneurons % 2 == 1:
-                for j in range(1):
-                    nervous_system.circuit_weights[int(\
-                        self.num_interneurons / 2), 
-                        self.num_interneurons + j] \
-                        = circuit_weights[index_counter]
-                    nervous_system.circuit_weights[int(\
-                        self.num_interneurons / 2), 
-                        self.circuit_size - j - 1] \
-                        = circuit_weights[index_counter]
-                    index_counter += 1                    
-
-            # Biases
-            bias_pars = \
-                rescale_parameter(periodic_boundary_conditions(
-                    x[circuit_index_end:bias_index_end],1), 
-                self.min_bias,
-                self.max_bias, self.min_search_value,
-                self.max_search_value)
-            biases = np.zeros(self.circuit_size)
-            for i in range(math.ceil(self.num_interneurons / 2)):
-                biases[i] = bias_pars[i]
-                biases[self.num_interneurons - i - 1] \
-                    = bias_pars[i]
-            # Motor biases
-            biases[-2] = bias_pars[-1]
-            biases[-1] = bias_pars[-1]
-            nervous_system.set_biases(biases)
-
-            # Time constants
-            time_constant_pars = rescale_parameter(periodic_boundary_conditions(
-                x[bias_index_end:],1), 
-                self.min_tau,
-                self.max_tau, self.min_search_value,
-                self.max_search_value)
-            time_constants = np.zeros(self.circuit_size)
-            for i in range(math.ceil(self.num_interneurons / 2)):
-                time_constants[i] = time_constant_pars[i]
-                time_constants[self.num_interneurons - i - 1] \
-                    = time_constant_pars[i]
+                circuit_weights[int(self.num_interneurons / 2),
+                    self.num_interneurons] = index_counter
+                circuit_weights[int(self.num_interneurons / 2),
+                    self.circuit_size - 1] = index_counter
 
-            # Motor time constants
-            time_constants[-2] = time_constant_pars[-1]
-            time_constants[-1] = time_constant_pars[-1]
-            nervous_system.set_time_constants(time_constants)
+            # Biases and time constants, motor neurons share the last one
+            for i in range(math.ceil(self.num_interneurons / 2)):
+                biases[i,] = circuit_index_end + i
+                biases[self.num_interneurons - i - 1,] = circuit_index_end + i
+                time_constants[i,] = bias_index_end + i
+                time_constants[self.num_interneurons - i - 1,] \
+                    = bias_index_end + i
+            for i in (self.circuit_size - 2, self.circuit_size - 1):
+                biases[i,] = bias_index_end - 1
+                time_constants[i,] = self.num_parameters - 1
 
         else:
 
-            sensor_index_end = self.num_sensor_weights
-            circuit_index_end = sensor_index_end + self.num_circuit_weights
             bias_index_end = circuit_index_end + self.circuit_size
 
             # Sensor Weights
-            sensor_weights = rescale_parameter(periodic_boundary_conditions(
-                x[:sensor_index_end],1), 
-                        self.min_weight,
-                        self.max_weight, self.min_search_value,
-                        self.max_search_value)
             for i in range(self.num_rays):
                 for j in range(self.num_interneurons):
-                    nervous_system.sensor_weights[i,j] = \
-                        sensor_weights[self.num_interneurons * i + j]
+                    sensor_weights[i, j] = self.num_interneurons * i + j
+
             # Circuit weights
-            circuit_weights = rescale_parameter(periodic_boundary_conditions(\
-                x[sensor_index_end:circuit_index_end],1), 
-                self.min_weight,
-                self.max_weight, self.min_search_value,
-                self.max_search_value)
             for i in range(self.num_interneurons):
                 for j in range(self.num_interneurons):
-                    nervous_system.circuit_weights[i,j] = \
-                        circuit_weights[self.num_interneurons * i + j]
+                    circuit_weights[i, j] = sensor_index_end \
+                        + self.num_interneurons * i + j
 
             for i in range(self.num_interneurons):
                 for j in range(2):
-                    nervous_system.circuit_weights[i, \
-                        self.num_interneurons + j] \
-                            = circuit_weights[self.num_interneurons 
-                                                * self.num_interneurons
-                                                + 2 * i + j]
-            # Biases
-            nervous_system.set_biases(
-                rescale_parameter(periodic_boundary_conditions(
-                    x[circuit_index_end:bias_index_end],1), 
-                self.min_bias,
-                self.max_bias, self.min_search_value,
-                self.max_search_value))
-
-            # Time constants
-            nervous_system.set_time_constants(
-                rescale_parameter(periodic_boundary_conditions(
-                    x[bias_index_end:],1), 
-                self.min_tau,
-                self.max_tau, self.min_search_value,
-                self.max_search_value))
-
-    def run_trials(self, agent, ball):
+                    circuit_weights[i, self.num_interneurons + j] \
+                        = sensor_index_end \
+                        + self.num_interneurons * self.num_interneurons \
+                        + 2 * i + j
+
+            # Biases and time constants
+            for i in range(self.circuit_size):
+                biases[i,] = circuit_index_end + i
+                time_constants[i,] = bias_index_end + i
+
+        # Gather indices (sources) and scatter indices (targets)
+        self._decoder_maps = {}
+        for name, assignments in (('sensor_weights', sensor_weights),
+                                  ('circuit_weights', circuit_weights),
+                                  ('biases', biases),
+                                  ('time_constants', time_constants)):
+            targets = tuple(np.array(axis, dtype=int)
+                            for axis in zip(*assignments.keys()))
+            sources = np.array(list(assignments.values()), dtype=int)
+            self._decoder_maps[name] = (targets, sources)
+
+        # Rescaling of each search parameter, see rescale_parameter
+        parameter_ranges = ((sensor_index_end, self.min_weight,
+                                self.max_weight),
+                            (circuit_index_end, self.min_weight,
+                                self.max_weight),
+                            (bias_index_end, self.min_bias, self.max_bias),
+                            (self.num_parameters, self.min_tau, self.max_tau))
+        self._decoder_scale = np.zeros(self.num_parameters)
+        self._decoder_offset = np.zeros(self.num_parameters)
+        start = 0
+        for end, min_param_value, max_param_value in parameter_ranges:
+            scale = (max_param_value - min_param_value) \
+                        / (self.max_search_value - self.min_search_value)
+            self._decoder_scale[start:end] = scale
+            self._decoder_offset[start:end] = min_param_value \
+                                            - scale * self.min_search_value
+            start = end
+
+    def decode_parameters(self, X):
+        """
+        X : search parameter values, (num_parameters,) or (N, num_parameters)
+
+        Returns the rescaled parameter values after periodic boundary
+        conditions are applied, with the same shape as X.
+        """
+
+        return self._decoder_scale * periodic_boundary_conditions(X, 1) \
+                + self._decoder_offset
+
+    def map_search_parameters(self, x, nervous_system):
+        """
+        x : numpy array of search parameter values
+        """
+
+        values = self.decode_parameters(np.asarray(x))
+
+        targets, sources = self._decoder_maps['sensor_weights']
+        nervous_system.sensor_weights[targets] = values[sources]
+
+        targets, sources = self._decoder_maps['circuit_weights']
+        nervous_system.circuit_weights[targets] = values[sources]
+
+        biases = nervous_system.biases[:, 0].copy()
+        targets, sources = self._decoder_maps['biases']
+        biases[targets] = values[sources]
+        nervous_system.set_biases(biases)
+
+        time_constants = nervous_system.taus[:, 0].copy()
+        targets, sources = self._decoder_maps['time_constants']
+        time_constants[targets] = values[sources]
+        nervous_system.set_time_constants(time_constants)
+
+    def run_trials(self, agent, ball, threshold=None):
+        """
+        Runs every trial and returns the fitness.
+
+        threshold : if given, the trials stop as soon as the fitness can no
+            longer exceed it and a FitnessBound is returned. Every trial
+            scores at most 1, so the bound is the fitness with the
+            remaining trials counted as 1.
+        """
 
         result_matrix = np.zeros((int(self.circle_max_diameter 
                                         / self.circle_difference), 
                                 int(self.circle_max_diameter 
                                     / self.circle_difference)))
-        for i in range(result_matrix.shape[0]):
-            for j in range(result_matrix.shape[1]):
-                if i != j:
-                    ball_size = i * self.circle_difference \
-                                    + self.circle_min_diameter
-                    compare_ball_size = j * self.circle_difference \
-                                    + self.circle_min_diameter
-                    result_matrix[i,j] = self.trial(agent, ball, 
-                                                ball_size, compare_ball_size)
+        rows, cols, presented_sizes, comparison_sizes = self._trial_grid()
+        num_trials = rows.shape[0]
+        seeds = self.trial_seeds(num_trials)
+        if threshold is not None:
+            result_matrix[:] = 1.0
+
+        if self.batch_trials:
+            num_rounds = 1 if threshold is None \
+                            else min(self.racing_rounds, num_trials)
+            for trials in np.array_split(np.arange(num_trials), num_rounds):
+                result_matrix[rows[trials], cols[trials]] = self.batch_trial(
+                    agent, presented_sizes[trials], comparison_sizes[trials],
+                    noise_seeds=[ seeds[k] for k in trials ])
+                if threshold is not None and trials[-1] != num_trials - 1:
+                    bound = self.eval_fitness(result_matrix)
+                    if bound <= threshold:
+                        return FitnessBound(bound)
+
+            return self.eval_fitness(result_matrix)
+
+        for k in range(num_trials):
+            result_matrix[rows[k], cols[k]] = self.trial(agent, ball,
+                presented_sizes[k], comparison_sizes[k], seed=seeds[k])
+            if threshold is not None and k != num_trials - 1:
+                bound = self.eval_fitness(result_matrix)
+                if bound <= threshold:
+                    return FitnessBound(bound)
 
         return self.eval_fitness(result_matrix)
 
-    def _record_data(self, agent, ball, start=True):
-
-        if start:
-            self.time_records = [0]
-            self.object_records = {}
-            self.object_records['ball'] = {'x': [ball.center_xpos],
-                                            'y': [ball.center_ypos],
-                                            'radius':[ball.size]}
-            self.object_records['agent'] = {'x': [agent.xpos], 
-                                            'y': [agent.ypos],
-                                            'radius': [agent.radius]}
-            for i, ray in enumerate(agent.rays):
-                self.object_records[i] = {'x1':[ray.x1], 
-                                        'y1':[ray.y1], 
-                                        'x2':[ray.y2], 
-                                        'y2':[ray.x2]}
-
-        else:
-
-            self.time_records.append(self.time_records[-1] + self.step_size)
-            self.object_records['ball']['x'].append(ball.center_xpos)
-            self.object_records['ball']['y'].append(ball.center_ypos)
-            self.object_records['ball']['radius'].append(ball.size)
-            self.object_records['agent']['x'].append(agent.xpos)
-            self.object_records['agent']['y'].append(agent.ypos)
-            self.object_records['agent']['radius'].append(agent.radius)
-            for i, ray in enumerate(agent.rays):
-                self.object_records[i]['x1'].append(ray.x1)
-                self.object_records[i]['y1'].append(ray.y1)
-                self.object_records[i]['x2'].append(ray.x2)
-                self.object_records[i]['y2'].append(ray.y2)
-
     def trial(self, agent, ball, presented_ball_size, comparison_ball_size,
-        record=False, validation=False):
+        record=False, validation=False, seed=None):
+        """
+        record : True or a TrialRecorder to record the trial with. True
+            records the ball, agent and rays at every step. The recorder is
+            kept as self.recorder, with its ball, agent and ray channels
+            also in self.object_records and sample times in
+            self.time_records.
+        seed : numpy SeedSequence of the trial's noise, each drop draws from
+            its own child stream. If None the nervous system continues its
+            current noise stream.
+        """
 
         agent.set_position(self.initial_agent_x, self.initial_agent_y)
-        agent.reset_rays()
         agent.nervous_system.initialize()
         agent.velocity_x = 0.0
-
-        initial_object_y = self.initial_agent_y - (agent.radius 
-                                                    + agent.max_ray_length 
-                                                    + presented_ball_size)
-        ball.set_position(self.initial_agent_x, initial_object_y)
-        ball.set_size(presented_ball_size / 2.0)
+        self._start_drop(agent, ball, presented_ball_size, seed, 0)
         agent.initialize_ray_sensors(ball)
 
         # If recording create initial setup
         if record:
-            self._record_data(agent, ball, start=True)
+            recorder = record if isinstance(record, TrialRecorder) \
+                        else TrialRecorder()
+            recorder.start(agent, ball, self.trial_length(presented_ball_size,
+                comparison_ball_size), self.step_size)
+            self.recorder = recorder
+            self.time_records = recorder.time
+            self.object_records = recorder.object_records()
 
         # First drop presented ball, hold agent still
-        while (ball.leading_edge_y() < agent.ypos - agent.radius):
-            ball.step(self.step_size)
-            agent.one_obj_step(self.step_size, ball, True)
+        if record:
+            trajectory = self.ball_trajectory(presented_ball_size).tolist()
+            fan_entry = self.fan_entry_step(presented_ball_size)
+            for step, ball_y in enumerate(trajectory):
+                ball.set_position(ball.center_xpos, ball_y)
+                if step < fan_entry:
+                    agent.no_obj_step(self.step_size, True)
+                else:
+                    agent.one_obj_step(self.step_size, ball, True)
+                recorder.record(agent, ball)
 
+        else:
+            # The sensor readings of the held agent are precomputed
+            sensor_states = agent.nervous_system.sensor_states
+            for sensors in self.first_drop_sensors(presented_ball_size):
+                sensor_states[:, 0] = sensors
+                agent.step(self.step_size, True)
+
+        self._start_drop(agent, ball, comparison_ball_size, seed, 1)
+
+        # Second drop comparison ball, let agent move. Until the ball enters
+        # the ray fan there is no need to clip the rays against it
+        trajectory = self.ball_trajectory(comparison_ball_size).tolist()
+        fan_entry = self.fan_entry_step(comparison_ball_size)
+        for ball_y in trajectory[:fan_entry]:
+            ball.set_position(ball.center_xpos, ball_y)
+            agent.no_obj_step(self.step_size, False)
+            # keep ball within world
+            agent.clip_position(self.world_left, self.world_right)
             if record:
-                self._record_data(agent, ball, start=False)
-
-        initial_object_y = self.initial_agent_y - (agent.radius 
-                                                    + agent.max_ray_length
-                                                    + comparison_ball_size)
-        ball.set_position(self.initial_agent_x, initial_object_y)
-        ball.set_size(comparison_ball_size / 2.0)
-        agent.reset_rays()
+                recorder.record(agent, ball)
 
-        # Second drop comparison ball, let agent move
-        while (ball.leading_edge_y() < agent.ypos - agent.radius):
-            ball.step(self.step_size)
+        for ball_y in trajectory[fan_entry:]:
+            ball.set_position(ball.center_xpos, ball_y)
             agent.one_obj_step(self.step_size, ball, False)
             # keep ball within world
             agent.clip_position(self.world_left, self.world_right)
             if record:
-                self._record_data(agent, ball, start=False)
+                recorder.record(agent, ball)
+
+        return self._trial_result(agent, ball, presented_ball_size,
+                                  comparison_ball_size, validation)
+
+    def stream_trial(self, agent, ball, presented_ball_size,
+        comparison_ball_size, validation=False, seed=None, stride=1):
+        """
+        Generator version of trial that yields a TrialSnapshot of the
+        initial state and then of every stride-th step. The trial can be
+        stopped early by closing the generator, otherwise its result is
+        the generator's return value.
+
+        The first drop is fully simulated, so the rays of the held agent
+        are clipped against the ball as in a recorded trial.
+        """
+
+        agent.set_position(self.initial_agent_x, self.initial_agent_y)
+        agent.nervous_system.initialize()
+        agent.velocity_x = 0.0
+        self._start_drop(agent, ball, presented_ball_size, seed, 0)
+        agent.initialize_ray_sensors(ball)
+        yield TrialSnapshot(0, self.step_size, True, agent, ball)
+
+        step = 0
+        fan_entry = self.fan_entry_step(presented_ball_size)
+        for ball_y in self.ball_trajectory(presented_ball_size).tolist():
+            ball.set_position(ball.center_xpos, ball_y)
+            if step < fan_entry:
+                agent.no_obj_step(self.step_size, True)
+            else:
+                agent.one_obj_step(self.step_size, ball, True)
+            step += 1
+            if step % stride == 0:
+                yield TrialSnapshot(step, self.step_size, True, agent, ball)
+
+        self._start_drop(agent, ball, comparison_ball_size, seed, 1)
+
+        fan_entry = step + self.fan_entry_step(comparison_ball_size)
+        for ball_y in self.ball_trajectory(comparison_ball_size).tolist():
+            ball.set_position(ball.center_xpos, ball_y)
+            if step < fan_entry:
+                agent.no_obj_step(self.step_size, False)
+            else:
+                agent.one_obj_step(self.step_size, ball, False)
+            agent.clip_position(self.world_left, self.world_right)
+            step += 1
+            if step % stride == 0:
+                yield TrialSnapshot(step, self.step_size, False, agent, ball)
+
+        return self._trial_result(agent, ball, presented_ball_size,
+                                  comparison_ball_size, validation)
+
+    def _start_drop(self, agent, ball, ball_size, seed, drop):
+        """
+        Places a ball of diameter ball_size above the agent and seeds the
+        noise of the drop
+        """
+
+        initial_object_y = self.initial_agent_y - (agent.radius 
+                                                    + agent.max_ray_length 
+                                                    + ball_size)
+        ball.set_position(self.initial_agent_x, initial_object_y)
+        ball.set_size(ball_size / 2.0)
+        agent.reset_rays()
+        if seed is not None and agent.nervous_system.noise_strength != 0.0:
+            agent.nervous_system.seed_noise(spawn_seed(seed, drop),
+                self.ball_trajectory(ball_size).shape[0])
+
+    def _trial_result(self, agent, ball, presented_ball_size,
+        comparison_ball_size, validation):
 
         if validation:
             # Returns trial success whether it caught of avoided (0,1)
@@ -433,6 +901,144 @@ class RelationalCategorization:
                     if presented_ball_size > comparison_ball_size \
                     else normalized_distance
 
+    def ball_trajectory(self, ball_size):
+        """
+        Returns the center y position of a ball of diameter ball_size after
+        each step of a drop, in a read-only array whose length is the number
+        of steps the drop takes. Trajectories are cached per size, see
+        _cached_table.
+        """
+
+        def compute():
+            # Same updates as Circle.step until the leading edge reaches
+            # the agent
+            ball_y = self.initial_agent_y - (self.agent_radius
+                                             + self.max_ray_length
+                                             + ball_size)
+            ball_radius = ball_size / 2.0
+            agent_bottom = self.initial_agent_y - self.agent_radius
+            trajectory = []
+            while ball_y + ball_radius < agent_bottom:
+                ball_y += self.step_size * self.obj_velocity
+                trajectory.append(ball_y)
+
+            return np.array(trajectory, dtype=float)
+
+        return self._cached_table('ball_trajectory', ball_size, compute)
+
+    def fan_entry_step(self, ball_size):
+        """
+        Returns the number of leading steps of a drop during which a ball of
+        diameter ball_size is out of reach of every ray. The agent only
+        moves sideways, so while the ball is further above the agent's
+        center than the agent radius plus the ray length, no ray can hit
+        it wherever the agent is.
+        """
+
+        reach = self.agent_radius + self.max_ray_length
+        gap = self.initial_agent_y - self.ball_trajectory(ball_size) \
+                - ball_size / 2.0 - reach
+
+        # Margin against rounding in the ray clipping
+        return int(np.count_nonzero(gap > 1e-9))
+
+    def first_drop_sensors(self, ball_size):
+        """
+        Returns the ray sensor readings at each step of the first drop of a
+        ball of diameter ball_size, as a read-only (steps, num_rays) array.
+        The agent is held still during that drop, so the readings do not
+        depend on the genome and are cached per size, see _cached_table.
+        """
+
+        def compute():
+            trajectory = self.ball_trajectory(ball_size)
+            rays = self.initial_rays()
+            ray_x2 = np.tile(rays.x2, (trajectory.shape[0], 1))
+            ray_y2 = np.tile(rays.y2, (trajectory.shape[0], 1))
+            circle_ray_intersections(rays.x1, rays.y1, ray_x2, ray_y2,
+                self.initial_agent_x, trajectory[:, None], ball_size / 2.0)
+            dx = ray_x2 - rays.x1
+            dy = ray_y2 - rays.y1
+            return (self.max_ray_length - np.sqrt(dx * dx + dy * dy)) \
+                    / self.max_ray_length
+
+        return self._cached_table('first_drop_sensors', ball_size, compute)
+
+    def initial_rays(self):
+        """
+        Returns a RayBundle for an agent at its initial position
+        """
+
+        visual_angle = 0 if self.num_rays == 1 else self.visual_angle
+        rays = RayBundle(np.linspace(-visual_angle / 2.0, visual_angle / 2.0,
+                                     self.num_rays),
+                         self.agent_radius, self.max_ray_length)
+        rays.reset(self.initial_agent_x, self.initial_agent_y)
+
+        return rays
+
+    def trial_length(self, presented_ball_size, comparison_ball_size):
+        """
+        Number of steps of a trial, not counting its initial state
+        """
+
+        return self.ball_trajectory(presented_ball_size).shape[0] \
+                + self.ball_trajectory(comparison_ball_size).shape[0]
+
+    def _geometry_cache(self):
+        """
+        Returns the dictionary of tables precomputed from the task geometry.
+        It is emptied whenever one of the parameters it depends on changes.
+        """
+
+        key = tuple(getattr(self, name) for name in _GEOMETRY_PARAMETERS)
+        if self._cache_key != key:
+            self._cache_key = key
+            self._cache = OrderedDict()
+
+        return self._cache
+
+    def _cached_table(self, name, ball_size, compute):
+        """
+        Returns the read-only table name of a ball size, calling compute to
+        build it if it is not in the geometry cache. The cache keeps the
+        GEOMETRY_CACHE_SIZE most recently used tables, enough for the sizes
+        of run_trials and ordered_validation_run, while the random sizes of
+        the other validation runs are dropped again as new ones come in.
+        """
+
+        cache = self._geometry_cache()
+        key = (name, float(ball_size))
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+
+        table = compute()
+        table.setflags(write=False)
+        cache[key] = table
+        while len(cache) > GEOMETRY_CACHE_SIZE:
+            cache.popitem(last=False)
+
+        return table
+
+    def batch_trial(self, agent, presented_ball_sizes, comparison_ball_sizes,
+        validation=False, noise_seeds=None):
+        """
+        Runs trial for every pair of presented and comparison ball sizes in
+        lockstep, using the agent's nervous system parameters. Returns an
+        array of fitness values, or (success, catch) arrays if validation.
+        noise_seeds holds the seed of each trial, see trial.
+        """
+
+        nervous_system = agent.nervous_system
+        return BatchSimulation(self).run(
+            nervous_system.sensor_weights[None],
+            nervous_system.circuit_weights[None],
+            nervous_system.biases.T,
+            nervous_system.rtaus.T,
+            presented_ball_sizes, comparison_ball_sizes,
+            validation=validation, noise_seeds=noise_seeds)
+
     def eval_fitness(self, fitness_matrix):
 
         col_avg = 0.0
@@ -461,13 +1067,14 @@ class RelationalCategorization:
         return min(col_avg / (fitness_matrix.shape[0] - 2) / 2, 
                     row_avg / (fitness_matrix.shape[0] - 2) / 2)
 
-    def run_test_trial(self, x, ball_size, comparison_ball_size):
+    def run_test_trial(self, x, ball_size, comparison_ball_size, record=True):
 
         # Generate agent
         agent = SensorAgent(self.agent_radius,
             self.mass, self.visual_angle, self.num_rays,
             self.max_ray_length, self.initial_agent_x, self.initial_agent_y,
-            self.circuit_size, self.max_velocity, noise_strength=self.noise_strength)
+            self.circuit_size, self.max_velocity, noise_strength=self.noise_strength,
+            integrator=self.integrator, dtype=self.dtype)
 
         # Generate circle
         ball = Circle(self.circle_size,
@@ -478,15 +1085,22 @@ class RelationalCategorization:
         self.map_search_parameters(x, agent.nervous_system)
 
         return self.trial(agent, ball, ball_size, 
-                                    comparison_ball_size, True)
+                                    comparison_ball_size, record)
 
-    def random_validation_run(self, x, num_pairs=1000):
+    def validation_trials(self, x, presented_ball_sizes,
+        comparison_ball_sizes, seeds=None):
+        """
+        Runs a validation trial of genome x for every pair of presented and
+        comparison ball sizes. seeds holds the noise seed of each trial, see
+        trial. Returns (success, catch) arrays.
+        """
 
         # Generate agent
         agent = SensorAgent(self.agent_radius,
             self.mass, self.visual_angle, self.num_rays,
             self.max_ray_length, self.initial_agent_x, self.initial_agent_y,
-            self.circuit_size, self.max_velocity, noise_strength=self.noise_strength)
+            self.circuit_size, self.max_velocity, noise_strength=self.noise_strength,
+            integrator=self.integrator, dtype=self.dtype)
 
         # Generate circle
         ball = Circle(self.circle_size,
@@ -495,52 +1109,179 @@ class RelationalCategorization:
 
         self.map_search_parameters(x, agent.nervous_system)
 
-        original_set = np.random.uniform(self.circle_min_diameter, 
+        num_pairs = len(presented_ball_sizes)
+        if seeds is None:
+            seeds = [None] * num_pairs
+
+        if self.batch_trials:
+            return self.batch_trial(agent, presented_ball_sizes,
+                comparison_ball_sizes, validation=True, noise_seeds=seeds)
+
+        success = np.zeros(num_pairs, dtype=int)
+        catch = np.zeros(num_pairs, dtype=int)
+        for i in range(num_pairs):
+            success[i], catch[i] = self.trial(agent, ball,
+                presented_ball_sizes[i], comparison_ball_sizes[i],
+                validation=True, seed=seeds[i])
+
+        return success, catch
+
+    def parallel_validation_trials(self, x, presented_ball_sizes,
+        comparison_ball_sizes, seeds=None, num_workers=1):
+        """
+        validation_trials with the size pairs split into num_workers chunks
+        that are run by a PoolEvaluator. Each trial keeps its own seed, so
+        the results do not depend on the number of workers.
+        """
+
+        if num_workers <= 1:
+            return self.validation_trials(x, presented_ball_sizes,
+                comparison_ball_sizes, seeds)
+
+        from .parallel import PoolEvaluator
+
+        num_pairs = len(presented_ball_sizes)
+        if seeds is None:
+            seeds = [None] * num_pairs
+
+        chunks = np.array_split(np.arange(num_pairs), num_workers)
+        jobs = [ ('validation_trials', (x, presented_ball_sizes[chunk],
+                    comparison_ball_sizes[chunk],
+                    [ seeds[i] for i in chunk ]))
+                 for chunk in chunks if chunk.shape[0] > 0 ]
+        with PoolEvaluator(self, num_workers=num_workers) as pool:
+            results = pool.run_jobs(jobs)
+
+        success = np.concatenate([ result[0] for result in results ])
+        catch = np.concatenate([ result[1] for result in results ])
+        return success, catch
+
+    def random_validation_run(self, x, num_pairs=1000, num_workers=1):
+
+        rng = np.random.default_rng(self.seed)
+        original_set = rng.uniform(self.circle_min_diameter, 
             self.circle_max_diameter, size=num_pairs)
-        comparison_set = np.random.uniform(self.circle_min_diameter, 
+        comparison_set = rng.uniform(self.circle_min_diameter, 
             self.circle_max_diameter, size=num_pairs)
+        seeds = self.trial_seeds(num_pairs)
 
-        total_performance = 0.0
-        for i in range(num_pairs):
-            success, catch = self.trial(agent, ball, original_set[i], 
-                comparison_set[i], validation=True)
-            total_performance += success
+        success, catch = self.parallel_validation_trials(x, original_set,
+            comparison_set, seeds, num_workers)
 
-        return total_performance / num_pairs
+        return np.sum(success) / num_pairs
 
-    def ordered_validation_run(self, x, num_sizes=20, num_trials=1):
+    def noise_sweep_trials(self, x, noise_strengths, presented_ball_sizes,
+        comparison_ball_sizes, seeds):
+        """
+        Runs a validation trial of genome x for every pair of presented and
+        comparison ball sizes at every noise strength, all in one
+        BatchSimulation. A pair is run with the same seed at every noise
+        strength, so all of them scale one stream of standard normal
+        samples. Returns the (num_strengths, num_pairs) success array.
+        """
 
-        # Generate agent
-        agent = SensorAgent(self.agent_radius,
-            self.mass, self.visual_angle, self.num_rays,
-            self.max_ray_length, self.initial_agent_x, self.initial_agent_y,
-            self.circuit_size, self.max_velocity, noise_strength=self.noise_strength)
+        noise_strengths = np.asarray(noise_strengths, dtype=float)
+        num_strengths = noise_strengths.shape[0]
+        num_pairs = len(presented_ball_sizes)
+        sensor_weights, circuit_weights, biases, time_constants = \
+            self.decode_population(np.asarray(x)[None, :])
 
-        # Generate circle
-        ball = Circle(self.circle_size,
-                    self.initial_agent_x, self.world_top,
-                    0.0, self.obj_velocity)
+        success, catch = BatchSimulation(self).run(sensor_weights,
+            circuit_weights, biases, 1. / time_constants,
+            np.tile(presented_ball_sizes, num_strengths),
+            np.tile(comparison_ball_sizes, num_strengths), validation=True,
+            noise_seeds=list(seeds) * num_strengths,
+            noise_strengths=np.repeat(noise_strengths, num_pairs))
 
-        self.map_search_parameters(x, agent.nervous_system)
+        return success.reshape(num_strengths, num_pairs)
+
+    def noise_sweep(self, x, noise_strengths, num_pairs=1000, num_workers=1):
+        """
+        Returns the fraction of successful trials of genome x at each of
+        the noise strengths, as random_validation_run would with the task's
+        noise_strength set to each of them. Every strength is tested on the
+        same random size pairs with common random numbers, see
+        noise_sweep_trials. The pairs are split between num_workers
+        processes.
+        """
+
+        rng = np.random.default_rng(self.seed)
+        original_set = rng.uniform(self.circle_min_diameter,
+            self.circle_max_diameter, size=num_pairs)
+        comparison_set = rng.uniform(self.circle_min_diameter,
+            self.circle_max_diameter, size=num_pairs)
+        sweep_seed = np.random.SeedSequence(self.seed)
+        seeds = [ spawn_seed(sweep_seed, i) for i in range(num_pairs) ]
+
+        if num_workers <= 1:
+            success = self.noise_sweep_trials(x, noise_strengths,
+                original_set, comparison_set, seeds)
+
+        else:
+            from .parallel import PoolEvaluator
+
+            chunks = np.array_split(np.arange(num_pairs), num_workers)
+            jobs = [ ('noise_sweep_trials', (x, noise_strengths,
+                        original_set[chunk], comparison_set[chunk],
+                        [ seeds[i] for i in chunk ]))
+                     for chunk in chunks if chunk.shape[0] > 0 ]
+            with PoolEvaluator(self, num_workers=num_workers) as pool:
+                success = np.concatenate(pool.run_jobs(jobs), axis=1)
+
+        return np.sum(success, axis=1) / num_pairs
+
+    def ordered_validation_run(self, x, num_sizes=20, num_trials=1,
+        num_workers=1):
 
         original_set = np.linspace(self.circle_min_diameter, 
                             self.circle_max_diameter, num_sizes)
         comparison_set = np.linspace(self.circle_min_diameter, 
                             self.circle_max_diameter, num_sizes)
 
-        comparison_results = np.zeros((num_sizes, num_sizes))
-        for i in range(num_sizes):
-            for j in range(num_sizes):
-                trial_catches = 0.0
-                for k in range(num_trials):
-                    success, catch = self.trial(agent, ball, original_set[i], 
-                        comparison_set[j], validation=True)
-                    trial_catches += catch
+        # Trials ordered by presented size, comparison size, repetition
+        presented, comparison = np.meshgrid(original_set, comparison_set,
+                                            indexing='ij')
+        seeds = self.trial_seeds(num_sizes * num_sizes * num_trials)
+        success, catch = self.parallel_validation_trials(x,
+            np.repeat(presented.ravel(), num_trials),
+            np.repeat(comparison.ravel(), num_trials), seeds, num_workers)
 
-                comparison_results[j,i] = trial_catches / float(num_trials)
+        comparison_results = catch.reshape(num_sizes, num_sizes,
+            num_trials).sum(axis=2).T / float(num_trials)
 
         return comparison_results, original_set, comparison_set
 
+    def ordered_validation_grids(self, X, num_sizes=20, num_trials=1):
+        """
+        X : (N, num_parameters) array of search parameter values
+
+        Returns the comparison results of ordered_validation_run for every
+        genome, stacked into a (N, num_sizes, num_sizes) array.
+        """
+
+        return np.array([ self.ordered_validation_run(x, num_sizes,
+                                                      num_trials)[0]
+                          for x in np.atleast_2d(X) ]).reshape(-1, num_sizes,
+                                                               num_sizes)
+
+# Parameters that do not change the cost of a genome, see
+# RelationalCategorization.caching_fitness
+_FITNESS_CACHE_EXEMPT = ('fitness_cache_size', 'fitness_cache_decimals',
+                         'batch_trials')
+
+# Attributes dropped by RelationalCategorization.__getstate__
+_UNPICKLED_ATTRIBUTES = ('_cache', '_cache_key', 'recorder', 'object_records',
+                         'time_records')
+
+# Number of precomputed trajectory and sensor tables kept, see
+# RelationalCategorization._cached_table
+GEOMETRY_CACHE_SIZE = 128
+
+# Parameters that the precomputed trajectory and sensor tables depend on
+_GEOMETRY_PARAMETERS = ('initial_agent_x', 'initial_agent_y', 'agent_radius',
+                        'visual_angle', 'num_rays', 'max_ray_length',
+                        'obj_velocity', 'step_size')
+
 def rescale_parameter(search_value, min_param_value, max_param_value,
     min_search_value, max_search_value):
 
@@ -556,12 +1297,18 @@ def periodic_boundary_conditions(value, bound):
 
 def plot_catch_contour(first_circle_sizes, second_circle_sizes,
     catch_fractions, levels="auto", prefix=""):
+    """
+    Requires matplotlib to run
+    """
+
+    import matplotlib.pyplot as plt
+    import matplotlib.cm as cm
 
     Z = catch_fractions
     X, Y = np.meshgrid(first_circle_sizes, second_circle_sizes)
 
     plt.clf()
-    if levels is "auto":
+    if levels == "auto":
         plt.contourf(X, Y, Z, cmap=cm.Greys)
     else:
         plt.contourf(X, Y, Z, cmap=cm.Greys, levels=levels)
@@ -575,17 +1322,37 @@ def plot_catch_contour(first_circle_sizes, second_circle_sizes,
     plt.clf()
     plt.close()
 
-def noise_analysis(task, agent, noise_strengths, num_pairs=1000, prefix=''):
+def noise_analysis(task, x, noise_strengths, num_pairs=1000, prefix='',
+    num_workers=1):
+    """
+    Measures the performance of genome x at each noise strength with
+    RelationalCategorization.noise_sweep, and saves both arrays to
+    prefix + "_noise_analysis.npz". Returns (performances,
+    noise_strengths), the arguments of plot_noise_analysis.
+    """
+
+    noise_strengths = np.asarray(noise_strengths, dtype=float)
+    performances = task.noise_sweep(x, noise_strengths, num_pairs,
+                                    num_workers)
+    np.savez(prefix + "_noise_analysis.npz", performances=performances,
+             noise_strengths=noise_strengths)
 
-    performances = []
-    for noise_std in noise_strengths:
-        task.noise_strength = noise_std
-        performances.append(task.random_validation_run(agent, num_pairs))
+    return performances, noise_strengths
+
+def load_noise_analysis(path):
+    """
+    Returns (performances, noise_strengths) saved by noise_analysis
+    """
 
-    utilities.save_object((performances, noise_strengths), 
-        prefix + "_noise_analysis.dat")
+    with np.load(path) as saved:
+        return saved['performances'], saved['noise_strengths']
 
 def plot_noise_analysis(performances, noise_strengths, prefix=''):
+    """
+    Requires matplotlib to run
+    """
+
+    import matplotlib.pyplot as plt
 
     # plt.clf()
     fig, ax = plt.subplots()
@@ -605,53 +1372,62 @@ def vpython_visualization(relcat_object, x, ball_size, comparison_ball_size):
     """
     relcat_object.run_test_trial(x, ball_size, comparison_ball_size)
 
+    recorder = relcat_object.recorder
+    vpython_replay(relcat_object.world_right, relcat_object.world_bottom,
+                   recorder.ball, recorder.agent, recorder.rays)
+
+def vpython_replay(world_right, world_bottom, ball_records, agent_records,
+    ray_records):
+    """
+    Replays recorded ball and agent (x, y, radius) samples and ray
+    (x1, y1, x2, y2) samples, see TrialRecorder. Requires VPython to run
+    """
+
     import vpython
     vpython.scene.title = "Trial Simulation"
-    vpython.scene.center = vpython.vector(relcat_object.world_right/2, 
-                          relcat_object.world_bottom/2,0)
+    vpython.scene.center = vpython.vector(world_right/2, 
+                          world_bottom/2,0)
     vpython.scene.background = vpython.color.black
     vpython.scene.range = 175
-    vpython.box(pos=vpython.vector(relcat_object.world_right/2,
-                  relcat_object.world_bottom/2,0),
-       length=relcat_object.world_right,
-       height=relcat_object.world_bottom,
+    vpython.box(pos=vpython.vector(world_right/2,
+                  world_bottom/2,0),
+       length=world_right,
+       height=world_bottom,
        width=1,
        color=vpython.color.white)
-    ball = vpython.sphere(pos=vpython.vector(relcat_object.object_records['ball']['x'][0],
-                      relcat_object.object_records['ball']['y'][0],0),
-                 radius=relcat_object.object_records['ball']['radius'][0],
+    ball = vpython.sphere(pos=vpython.vector(ball_records[0, 0],
+                      ball_records[0, 1],0),
+                 radius=ball_records[0, 2],
                  color=vpython.color.blue)
-    agent = vpython.sphere(pos=vpython.vector(relcat_object.object_records['agent']['x'][0],
-                      relcat_object.object_records['agent']['y'][0],0),
-                 radius=relcat_object.object_records['agent']['radius'][0],
+    agent = vpython.sphere(pos=vpython.vector(agent_records[0, 0],
+                      agent_records[0, 1],0),
+                 radius=agent_records[0, 2],
                  color=vpython.color.orange)
     rays = []
-    for i in range(relcat_object.num_rays):
-        rays.append(arrow(pos=vpython.vector(relcat_object.object_records[i]['x1'][0],
-                              relcat_object.object_records[i]['y1'][0],0),
-                         axis=vpython.vector(relcat_object.object_records[i]['x2'][0] 
-                                     - relcat_object.object_records[i]['x1'][0],
-                                     relcat_object.object_records[i]['y2'][0]
-                                     - relcat_object.object_records[i]['y1'][0],0),
+    for i in range(ray_records.shape[1]):
+        rays.append(vpython.arrow(pos=vpython.vector(ray_records[0, i, 0],
+                              ray_records[0, i, 1],0),
+                         axis=vpython.vector(ray_records[0, i, 2] 
+                                     - ray_records[0, i, 0],
+                                     ray_records[0, i, 3]
+                                     - ray_records[0, i, 1],0),
                          color=vpython.color.cyan,
                          shaftwidth=1))
 
     while True:
-        for i in range(len(relcat_object.time_records)):
-            rate(150)
-            ball.pos.x = relcat_object.object_records['ball']['x'][i]
-            ball.pos.y = relcat_object.object_records['ball']['y'][i]
-            ball.radius = relcat_object.object_records['ball']['radius'][i]
-            agent.pos.x = relcat_object.object_records['agent']['x'][i]
-            agent.pos.y = relcat_object.object_records['agent']['y'][i]
-            agent.radius = relcat_object.object_records['agent']['radius'][i]
+        for i in range(ball_records.shape[0]):
+            vpython.rate(150)
+            ball.pos.x = ball_records[i, 0]
+            ball.pos.y = ball_records[i, 1]
+            ball.radius = ball_records[i, 2]
+            agent.pos.x = agent_records[i, 0]
+            agent.pos.y = agent_records[i, 1]
+            agent.radius = agent_records[i, 2]
             for j, ray in enumerate(rays):
-                ray.pos.x = relcat_object.object_records[j]['x1'][i]
-                ray.pos.y = relcat_object.object_records[j]['y1'][i]
-                ray.axis.x = relcat_object.object_records[j]['x2'][i] \
-                        - relcat_object.object_records[j]['x1'][i]
-                ray.axis.y = relcat_object.object_records[j]['y2'][i] \
-                        - relcat_object.object_records[j]['y1'][i]
+                ray.pos.x = ray_records[i, j, 0]
+                ray.pos.y = ray_records[i, j, 1]
+                ray.axis.x = ray_records[i, j, 2] - ray_records[i, j, 0]
+                ray.axis.y = ray_records[i, j, 3] - ray_records[i, j, 1]
 
 if __name__ == '__main__':
     """
@@ -1,7 +1,7 @@
 import numpy as np
 import math
 from .sensor_ctrnn import SensorCTRNN
-from .visual_objects import Ray
+from .visual_objects import RayBundle
 
 def reset_ray(ray, theta, center_xpos, center_ypos, radius, max_ray_length):
 
@@ -24,11 +24,19 @@ class SensorAgent:
     categorization task. It is adapted from code made by
     Randall Beer in C++.
 
+    The rays are held in a RayBundle, so moving the agent translates
+    all of them with a single array operation.
+
     """
 
+    __slots__ = ('radius', 'mass', 'visual_angle', 'num_of_rays',
+                 'max_ray_length', 'xpos', 'ypos', 'circuit_size',
+                 'max_velocity', 'velocity_x', 'nervous_system', 'rays')
+
     def __init__(self, agent_radius, agent_mass, agent_visual_angle,
         num_of_rays, max_ray_length, agent_xpos, agent_ypos, circuit_size,
-        max_velocity, noise_strength=0.0):
+        max_velocity, noise_strength=0.0, integrator='euler',
+        dtype=np.float64):
 
         self.radius = agent_radius
         self.mass = agent_mass
@@ -45,17 +53,18 @@ class SensorAgent:
         self.velocity_x = 0.0
 
         self.nervous_system = SensorCTRNN(self.circuit_size, self.num_of_rays, 
-                                            noise_strength=noise_strength)
-        self.rays = [ Ray() for i in range(self.num_of_rays) ]
+                                            noise_strength=noise_strength,
+                                            integrator=integrator,
+                                            dtype=dtype)
+        self.rays = RayBundle(np.linspace(-self.visual_angle/2.0, 
+                                    self.visual_angle/2.0, self.num_of_rays),
+                              self.radius, self.max_ray_length, dtype)
 
         self.reset_rays()
 
     def reset_rays(self):
 
-        for i, theta in enumerate(np.linspace(-self.visual_angle/2.0, 
-                                    self.visual_angle/2.0, self.num_of_rays)):
-            reset_ray(self.rays[i], theta, self.xpos, self.ypos, 
-                    self.radius, self.max_ray_length)
+        self.rays.reset(self.xpos, self.ypos)
 
     def set_position_x(self, x):
 
@@ -67,12 +76,7 @@ class SensorAgent:
 
     def set_position(self, x, y):
 
-        for ray in self.rays:
-            ray.x2 += x - self.xpos
-            ray.x1 += x - self.xpos
-            ray.y2 += y - self.ypos
-            ray.y1 += y - self.ypos
-
+        self.rays.translate(x - self.xpos, y - self.ypos)
         self.xpos = x
         self.ypos = y
 
@@ -81,44 +85,36 @@ class SensorAgent:
         if (self.xpos - self.radius < left):
             dx = left - self.xpos + self.radius
             self.xpos = left + self.radius
-
-            for ray in self.rays:
-                ray.x1 += dx
-                ray.x2 += dx
+            self.rays.translate(dx, 0.0)
 
         elif (self.xpos + self.radius > right):
             dx = self.xpos + self.radius - right
             self.xpos = right - self.radius
-            
-            for ray in self.rays:
-                ray.x1 -= dx
-                ray.x2 -= dx
+            self.rays.translate(-dx, 0.0)
 
     def initialize_ray_sensors(self, visual_obj, visual_obj2=None):
 
         # Reset the ray positions
-        for ray in self.rays:
-            ray.x2 = self.xpos + ray.init_relative_end_x
-            ray.y2 = self.ypos - ray.init_relative_end_y
-
-        # Clip each ray to the visual object
-        for ray in self.rays:
-            visual_obj.ray_intersection(ray)
-            if visual_obj2 != None:
-                visual_obj2.ray_intersection(ray)
-            dx = ray.x2 - ray.x1
-            dy = ray.y2 - ray.y1
-            ray.length = math.sqrt(dx * dx + dy * dy)
+        rays = self.rays
+        np.add(self.xpos, rays.init_relative_end_x, out=rays.x2)
+        np.subtract(self.ypos, rays.init_relative_end_y, out=rays.y2)
+
+        # Clip all rays to the visual objects
+        if visual_obj != None:
+            visual_obj.ray_intersections(rays.x1, rays.y1, rays.x2, rays.y2)
+        if visual_obj2 != None:
+            visual_obj2.ray_intersections(rays.x1, rays.y1, rays.x2, rays.y2)
+        rays.update_lengths()
 
         # Update the visual sensors states (fraction of part cut off)
-        for i, ray in enumerate(self.rays):
-            self.nervous_system.set_sensor(i, 
-                (self.max_ray_length - ray.length) / self.max_ray_length)
+        sensors = self.nervous_system.sensor_states[:, 0]
+        np.subtract(self.max_ray_length, rays.length, out=sensors)
+        sensors /= self.max_ray_length
 
     def step(self, step_size, locked):
 
         # Update the nervous system
-        self.nervous_system.euler_step(step_size)
+        self.nervous_system.step(step_size)
 
         # Update the body effectors
         if locked:
@@ -139,6 +135,14 @@ class SensorAgent:
 
         self.set_position(self.xpos + step_size * self.velocity_x, self.ypos)
 
+    def no_obj_step(self, step_size, locked):
+        """
+        Step the agent when no visual object is within reach of its rays
+        """
+
+        self.initialize_ray_sensors(None)
+        self.step(step_size, locked)
+
     def one_obj_step(self, step_size, visual_obj, locked):
         """
         Step the agent with one visual object
@@ -4,6 +4,20 @@ def sigmoid(x):
 
     return 1.0 / (1.0 + np.exp(-x))
 
+# Integration methods that SensorCTRNN.step can use, see SensorCTRNN
+INTEGRATORS = ('euler', 'exponential', 'rk4')
+
+def spawn_seed(seed_sequence, key):
+    """
+    Returns the child of a numpy SeedSequence with the given spawn key.
+    Unlike SeedSequence.spawn this does not depend on how many children
+    were spawned before.
+    """
+
+    return np.random.SeedSequence(seed_sequence.entropy,
+        spawn_key=seed_sequence.spawn_key + (key,),
+        pool_size=seed_sequence.pool_size)
+
 class SensorCTRNN:
     """
     A class for continuous-time recurrent neural networks
@@ -14,43 +28,151 @@ class SensorCTRNN:
     """
 
     def __init__(self, circuit_size, num_of_sensors,
-        bias_limit=16, gain_limit=1, noise_strength=0.0):
+        bias_limit=16, gain_limit=1, noise_strength=0.0,
+        noise_block_size=1024, integrator='euler', dtype=np.float64):
         """
         Initializes the CTRNN and its parameters to zero
 
         The bias and gain limits are for determining the max
         allowed state to prevent numerical instabilities and overflow.
+
+        Noise is drawn noise_block_size steps at a time from a numpy
+        Generator, see seed_noise.
+
+        integrator selects the method step uses, one of INTEGRATORS:
+            euler : forward Euler, see euler_step
+            exponential : exact integration of the leaky term with the
+                input held fixed over the step, see exponential_step
+            rk4 : classic fourth order Runge-Kutta, see rk4_step
+
+        dtype is the floating point type of the states, weights and other
+        arrays, np.float64 or np.float32. The overflow bound on the states
+        is taken from its range.
         """
 
         self.circuit_size = circuit_size
         self.num_of_sensors = num_of_sensors
+        self.dtype = np.dtype(dtype)
         self.noise_strength = noise_strength
+        self.noise_block_size = noise_block_size
+        self.noise_rng = None
+        self._noise_block = np.zeros((0, self.circuit_size), dtype=self.dtype)
+        self._noise_index = 0
 
-        self.ctrnn_states = np.zeros((self.circuit_size, 1))
-        self.ctrnn_outputs = np.zeros((self.circuit_size, 1))
-        self.biases = np.zeros((self.circuit_size, 1))
-        self.gains = np.ones((self.circuit_size, 1))
-        self.taus = np.ones((self.circuit_size, 1))
-        self.rtaus = np.ones((self.circuit_size, 1))
-        self.sensor_states = np.zeros((self.num_of_sensors, 1))
-        self.circuit_weights = np.zeros((self.circuit_size, \
-                                        self.circuit_size))
+        self.ctrnn_states = np.zeros((self.circuit_size, 1), dtype=self.dtype)
+        self.biases = np.zeros((self.circuit_size, 1), dtype=self.dtype)
+        self.gains = np.ones((self.circuit_size, 1), dtype=self.dtype)
+        self.taus = np.ones((self.circuit_size, 1), dtype=self.dtype)
+        self.rtaus = np.ones((self.circuit_size, 1), dtype=self.dtype)
+
+        # The sensor states and neuron outputs are stored in one input
+        # column, and the sensor and circuit weights in one pre-transposed
+        # matrix, so euler_step needs a single matrix-vector product.
+        # sensor_states, ctrnn_outputs, sensor_weights and circuit_weights
+        # are views into these.
+        self._inputs = np.zeros((self.num_of_sensors + self.circuit_size, 1),
+                                dtype=self.dtype)
+        self._sensor_states = self._inputs[:self.num_of_sensors]
+        self._ctrnn_outputs = self._inputs[self.num_of_sensors:]
         # Note that sensor weights is larger than it should be
         # This is because the original code didn't factor in
         # the motor neurons. The weight matrix entries for the motor 
         # neurons are initialized to 0.0 and just never updated
         # during evolution
-        self.sensor_weights = np.zeros((self.num_of_sensors, \
-                                        self.circuit_size))
+        self._weights_t = np.zeros((self.circuit_size, 
+                                    self.num_of_sensors + self.circuit_size),
+                                   dtype=self.dtype)
+        self._sensor_weights = self._weights_t[:, :self.num_of_sensors].T
+        self._circuit_weights = self._weights_t[:, self.num_of_sensors:].T
+
+        # Work buffers for euler_step
+        self._step_buffer = np.zeros((self.circuit_size, 1), dtype=self.dtype)
+        self._rate_buffer = np.zeros((self.circuit_size, 1), dtype=self.dtype)
 
         # Overflow bounds
-        self.maxstate = (np.log(np.finfo(np.float64).max) - bias_limit) / gain_limit
+        self.maxstate = (np.log(np.finfo(self.dtype).max) - bias_limit) / gain_limit
+
+        self.integrator = integrator
+
+    @property
+    def integrator(self):
+
+        return self._integrator
+
+    @integrator.setter
+    def integrator(self, integrator):
+
+        if integrator not in INTEGRATORS:
+            raise ValueError("Error: unknown integrator " + str(integrator))
+        self._integrator = integrator
+        self._step_method = getattr(self, integrator + '_step')
+
+    @property
+    def sensor_states(self):
+
+        return self._sensor_states
+
+    @sensor_states.setter
+    def sensor_states(self, values):
+
+        self._sensor_states[:] = values
+
+    @property
+    def ctrnn_outputs(self):
+
+        return self._ctrnn_outputs
+
+    @ctrnn_outputs.setter
+    def ctrnn_outputs(self, values):
+
+        self._ctrnn_outputs[:] = values
+
+    @property
+    def sensor_weights(self):
+
+        return self._sensor_weights
+
+    @sensor_weights.setter
+    def sensor_weights(self, values):
+
+        self._sensor_weights[:] = values
+
+    @property
+    def circuit_weights(self):
+
+        return self._circuit_weights
+
+    @circuit_weights.setter
+    def circuit_weights(self, values):
+
+        self._circuit_weights[:] = values
+
+    def seed_noise(self, seed=None, block_size=None):
+        """
+        Restarts the noise stream from a new numpy Generator. seed is
+        anything numpy.random.default_rng accepts, such as an int or a
+        SeedSequence.
+        """
+
+        self.noise_rng = np.random.default_rng(seed)
+        if block_size is not None:
+            self.noise_block_size = block_size
+        self._noise_block = np.zeros((0, self.circuit_size), dtype=self.dtype)
+        self._noise_index = 0
 
     def white_noise(self, step_size):
 
-        return np.sqrt(step_size * self.rtaus) \
-            * np.random.normal(loc=0.0, scale=1.0, size=(self.circuit_size,1)) \
-            * self.noise_strength
+        if self._noise_index == self._noise_block.shape[0]:
+            if self.noise_rng is None:
+                self.seed_noise()
+            self._noise_block = self.noise_rng.standard_normal(
+                (self.noise_block_size, self.circuit_size), dtype=self.dtype)
+            self._noise_index = 0
+
+        sample = self._noise_block[self._noise_index, :, None]
+        self._noise_index += 1
+
+        return np.sqrt(step_size * self.rtaus) * sample * self.noise_strength
 
     def randomize_state(self, random_variable_lower_bound=-1.0, \
             random_variable_upper_bound=1.0):
@@ -61,7 +183,7 @@ class SensorCTRNN:
 
         self.ctrnn_states = np.random.uniform(random_variable_lower_bound, 
                         random_variable_upper_bound, 
-                        size=(self.circuit_size,1))
+                        size=(self.circuit_size,1)).astype(self.dtype)
         self.ctrnn_outputs = \
                     sigmoid(self.gains * self.ctrnn_states + self.biases)
         self.sensor_states = np.zeros((self.num_of_sensors, 1))
@@ -72,20 +194,102 @@ class SensorCTRNN:
         for i in range(self.num_of_sensors):
             self.set_sensor(i, 0.0)
 
+    def step(self, step_size):
+        """
+        Steps the network with the selected integrator
+        """
+
+        self._step_method(step_size)
+
     def euler_step(self, step_size):
         """
         Steps the network's states and outputs using the Euler method.
         This uses Beer's standard CTRNN equation.
 
+        Works in place on preallocated buffers, and only draws noise when
+        noise_strength is non-zero.
+
         """
-        
-        inputs = np.dot(self.sensor_weights.T, self.sensor_states) \
-                    + np.dot(self.circuit_weights.T, self.ctrnn_outputs)
-        self.ctrnn_states += step_size * self.rtaus \
-                            * (inputs - self.ctrnn_states) + self.white_noise(step_size)
+
+        update = self._step_buffer
+        rate = self._rate_buffer
+        np.dot(self._weights_t, self._inputs, out=update)
+        update -= self.ctrnn_states
+        np.multiply(step_size, self.rtaus, out=rate)
+        update *= rate
+        if self.noise_strength != 0.0:
+            update += self.white_noise(step_size)
+        self.ctrnn_states += update
         np.clip(self.ctrnn_states, -self.maxstate, self.maxstate, out=self.ctrnn_states)
-        self.ctrnn_outputs = sigmoid(self.gains 
-                                        * self.ctrnn_states + self.biases)
+        self._update_outputs()
+
+    def exponential_step(self, step_size):
+        """
+        Steps the network by integrating the leaky term exactly while
+        holding the weighted input I fixed over the step:
+        y += (1 - exp(-step_size / tau)) * (I - y)
+        This stays stable for steps larger than the smallest time constant.
+
+        """
+
+        update = self._step_buffer
+        rate = self._rate_buffer
+        np.dot(self._weights_t, self._inputs, out=update)
+        update -= self.ctrnn_states
+        np.multiply(-step_size, self.rtaus, out=rate)
+        np.expm1(rate, out=rate)
+        np.negative(rate, out=rate)
+        update *= rate
+        if self.noise_strength != 0.0:
+            update += self.white_noise(step_size)
+        self.ctrnn_states += update
+        np.clip(self.ctrnn_states, -self.maxstate, self.maxstate, out=self.ctrnn_states)
+        self._update_outputs()
+
+    def rk4_step(self, step_size):
+        """
+        Steps the network with the classic fourth order Runge-Kutta method,
+        holding the sensor states fixed over the step. Noise is added once
+        per step as in euler_step.
+
+        """
+
+        sensor_input = np.dot(self._weights_t[:, :self.num_of_sensors],
+                              self._sensor_states)
+        circuit_weights_t = self._weights_t[:, self.num_of_sensors:]
+
+        def derivative(states, outputs):
+            return self.rtaus * (sensor_input
+                    + np.dot(circuit_weights_t, outputs) - states)
+
+        states = self.ctrnn_states
+        k1 = derivative(states, self._ctrnn_outputs)
+        y = states + 0.5 * step_size * k1
+        k2 = derivative(y, sigmoid(self.gains * y + self.biases))
+        y = states + 0.5 * step_size * k2
+        k3 = derivative(y, sigmoid(self.gains * y + self.biases))
+        y = states + step_size * k3
+        k4 = derivative(y, sigmoid(self.gains * y + self.biases))
+
+        update = step_size / 6.0 * (k1 + 2.0 * k2 + 2.0 * k3 + k4)
+        if self.noise_strength != 0.0:
+            update += self.white_noise(step_size)
+        self.ctrnn_states += update
+        np.clip(self.ctrnn_states, -self.maxstate, self.maxstate, out=self.ctrnn_states)
+        self._update_outputs()
+
+    def _update_outputs(self):
+        """
+        Outputs from the current states in place, see sigmoid
+        """
+
+        update = self._step_buffer
+        np.multiply(self.gains, self.ctrnn_states, out=update)
+        update += self.biases
+        np.negative(update, out=update)
+        np.exp(update, out=update)
+        update += 1.0
+        np.divide(1.0, update, out=self._ctrnn_outputs)
 
     def neuron_output(self, index):
 
@@ -100,14 +304,14 @@ class SensorCTRNN:
         if len(bias_sequence) != self.circuit_size:
             raise IndexError("Error: Bias sequence length != circuit size")
         else:
-            self.biases = np.array(bias_sequence).reshape(
+            self.biases = np.array(bias_sequence, dtype=self.dtype).reshape(
                                                     self.circuit_size, 1)
     def set_gains(self, gain_sequence):
 
         if len(gain_sequence) != self.circuit_size:
             raise IndexError("Error: Gain sequence length != circuit size")
         else:
-            self.gains = np.array(gain_sequence).reshape(
+            self.gains = np.array(gain_sequence, dtype=self.dtype).reshape(
                                                     self.circuit_size, 1)
 
     def set_time_constants(self, time_constants):
@@ -115,7 +319,7 @@ class SensorCTRNN:
         if len(time_constants) != self.circuit_size:
             raise IndexError("Error: Time constants len != circuit size")
         else:
-            self.taus = np.array(time_constants).reshape(
+            self.taus = np.array(time_constants, dtype=self.dtype).reshape(
                                                     self.circuit_size, 1)
             self.rtaus = 1. / self.taus
     
@@ -6,11 +6,18 @@ Python version of code written by RDB.
 import numpy as np
 import math
 
+# Below this number of rays Circle.ray_intersections loops over the rays,
+# which is cheaper than the call overhead of the array kernel
+MIN_VECTORIZED_RAYS = 48
+
 class Ray:
     """
     Represents a ray, which is a line segment in space.
     """
 
+    __slots__ = ('x1', 'y1', 'x2', 'y2', 'angle', 'length',
+                 'init_relative_end_x', 'init_relative_end_y')
+
     def __init__(self, x1=0, y1=0, x2=0, y2=0, angle=0, length=0,
         init_relative_end_x=0, init_relative_end_y=0):
 
@@ -23,11 +30,91 @@ class Ray:
         self.init_relative_end_x = init_relative_end_x
         self.init_relative_end_y = init_relative_end_y
 
+class RayBundle:
+    """
+    Struct-of-arrays form of a fan of rays. Every attribute of Ray is
+    stored as a contiguous array with one entry per ray, along with the
+    unit direction of each ray, which is fixed by its angle. The arrays
+    have the given floating point dtype.
+    """
+
+    __slots__ = ('angle', 'direction_x', 'direction_y', 'start_x', 'start_y',
+                 'init_relative_end_x', 'init_relative_end_y',
+                 'x1', 'y1', 'x2', 'y2', 'length')
+
+    def __init__(self, angles, radius, max_ray_length, dtype=np.float64):
+
+        self.angle = np.array(angles, dtype=float)
+        self.direction_x = np.array([ math.sin(theta) 
+                                      for theta in self.angle ])
+        self.direction_y = np.array([ math.cos(theta) 
+                                      for theta in self.angle ])
+
+        # Offsets of the ray end-points from the center of the agent
+        self.start_x = radius * self.direction_x
+        self.start_y = radius * self.direction_y
+        self.init_relative_end_x = self.start_x \
+                                + max_ray_length * self.direction_x
+        self.init_relative_end_y = self.start_y \
+                                + max_ray_length * self.direction_y
+
+        # The geometry is worked out in double precision before it is cast
+        for name in ('angle', 'direction_x', 'direction_y', 'start_x',
+                     'start_y', 'init_relative_end_x', 'init_relative_end_y'):
+            setattr(self, name, getattr(self, name).astype(dtype, copy=False))
+
+        self.x1 = np.zeros(self.angle.shape[0], dtype=dtype)
+        self.y1 = np.zeros(self.angle.shape[0], dtype=dtype)
+        self.x2 = np.zeros(self.angle.shape[0], dtype=dtype)
+        self.y2 = np.zeros(self.angle.shape[0], dtype=dtype)
+        self.length = np.zeros(self.angle.shape[0], dtype=dtype)
+
+    def __len__(self):
+
+        return self.angle.shape[0]
+
+    def __getitem__(self, index):
+        """
+        Returns a Ray with a copy of the index'th ray's values
+        """
+
+        return Ray(self.x1[index], self.y1[index], self.x2[index],
+            self.y2[index], self.angle[index], self.length[index],
+            self.init_relative_end_x[index], self.init_relative_end_y[index])
+
+    def reset(self, center_xpos, center_ypos):
+        """
+        Places the rays at full length around the given center
+        """
+
+        np.add(center_xpos, self.start_x, out=self.x1)
+        np.subtract(center_ypos, self.start_y, out=self.y1)
+        np.add(center_xpos, self.init_relative_end_x, out=self.x2)
+        np.subtract(center_ypos, self.init_relative_end_y, out=self.y2)
+        self.update_lengths()
+
+    def translate(self, dx, dy):
+
+        self.x1 += dx
+        self.x2 += dx
+        if dy != 0:
+            self.y1 += dy
+            self.y2 += dy
+
+    def update_lengths(self):
+
+        dx = self.x2 - self.x1
+        dy = self.y2 - self.y1
+        np.sqrt(dx * dx + dy * dy, out=self.length)
+
 class VisualObject:
     """
     Based class for the other objects
     """
 
+    __slots__ = ('size', 'center_xpos', 'center_ypos',
+                 'velocity_x', 'velocity_y')
+
     def __init__(self, size, center_xpos, center_ypos,
         velocity_x=0.0, velocity_y=0.0):
 
@@ -83,13 +170,42 @@ class VisualObject:
         self.velocity_x = velocity_x
         self.velocity_y = velocity_y
 
+    def ray_intersections(self, x1, y1, x2, y2):
+        """
+        Clips the end-points (x2, y2) of a set of rays in place. Falls back
+        on ray_intersection for each ray, subclasses with an array kernel
+        override it.
+        """
+
+        ray = Ray()
+        clipped_x2 = []
+        clipped_y2 = []
+        for ray.x1, ray.y1, ray.x2, ray.y2 in zip(x1.tolist(), y1.tolist(),
+                                                  x2.tolist(), y2.tolist()):
+            self.ray_intersection(ray)
+            clipped_x2.append(ray.x2)
+            clipped_y2.append(ray.y2)
+
+        x2[:] = clipped_x2
+        y2[:] = clipped_y2
+
 class Circle(VisualObject):
 
+    __slots__ = ()
+
     def __init__(self, size, center_xpos, center_ypos,
                 velocity_x=0.0, velocity_y=0.0):
         super().__init__(size, center_xpos, center_ypos,
             velocity_x=velocity_x, velocity_y=velocity_y)
 
+    def ray_intersections(self, x1, y1, x2, y2):
+
+        if x2.shape[0] < MIN_VECTORIZED_RAYS:
+            return super().ray_intersections(x1, y1, x2, y2)
+
+        circle_ray_intersections(x1, y1, x2, y2, self.center_xpos,
+            self.center_ypos, self.size)
+
     def ray_intersection(self, ray):
         """
         Determines whether the ray has intersected the object
@@ -148,8 +264,45 @@ class Circle(VisualObject):
 
         return None
 
+def circle_ray_intersections(x1, y1, x2, y2, center_xpos, center_ypos, size):
+    """
+    Array version of Circle.ray_intersection. Clips the end-points (x2, y2)
+    of every ray in place. All arguments are broadcast together, so one
+    call can handle many rays against many circles.
+    """
+
+    dx = x2 - x1
+    dy = y2 - y1
+    a = dx * dx + dy * dy
+    u = ((center_xpos - x1) * dx + (center_ypos - y1) * dy) / a
+    nearX = x1 + u * dx
+    nearY = y1 + u * dy
+    near = ~(np.sqrt((center_xpos - nearX) * (center_xpos - nearX)
+                     + (center_ypos - nearY) * (center_ypos - nearY)) > size)
+    if not near.any():
+        return None
+
+    b = 2 * (dx * (x1 - center_xpos) + dy * (y1 - center_ypos))
+    c = center_xpos * center_xpos \
+        + center_ypos * center_ypos \
+        + x1 * x1 + y1 * y1 - 2 * \
+        (center_xpos * x1 + center_ypos * y1) \
+        - size * size
+    i = b * b - 4 * a * c
+
+    # The tangent (i == 0) and two root (i > 0) cases both clip to
+    # (-b + sqrt(i)) / 2a, since sqrt(0) leaves -b / 2a unchanged
+    u = (-b + np.sqrt(np.maximum(i, 0))) / (2 * a)
+    clip = near & (i >= 0) & (u >= 0) & (u <= 1)
+    np.copyto(x2, x1 + u * dx, where=clip)
+    np.copyto(y2, y1 + u * dy, where=clip)
+
+    return None
+
 class Diamond(VisualObject):
 
+    __slots__ = ()
+
     def __init__(self, size, center_xpos, center_ypos,
             velocity_x=0.0, velocity_y=0.0):
         super().__init__(size, center_xpos, center_ypos,
@@ -195,6 +348,8 @@ class Diamond(VisualObject):
 
 class Line(VisualObject):
 
+    __slots__ = ()
+
     def __init__(self, size, center_xpos, center_ypos):
         super().__init__(size, center_xpos, center_ypos)
 
@@ -219,6 +374,182 @@ class Line(VisualObject):
 
         return self.center_ypos
 
+def circle_ray_fractions(x1, y1, x2, y2, center_xpos, center_ypos, size):
+    """
+    Returns how far along each ray circle_ray_intersections would clip it,
+    as a fraction of the ray, or inf where it does not clip the ray.
+    Arguments are broadcast together.
+    """
+
+    dx = x2 - x1
+    dy = y2 - y1
+    a = dx * dx + dy * dy
+    u = ((center_xpos - x1) * dx + (center_ypos - y1) * dy) / a
+    nearX = x1 + u * dx
+    nearY = y1 + u * dy
+    near = ~(np.sqrt((center_xpos - nearX) * (center_xpos - nearX)
+                     + (center_ypos - nearY) * (center_ypos - nearY)) > size)
+
+    b = 2 * (dx * (x1 - center_xpos) + dy * (y1 - center_ypos))
+    c = center_xpos * center_xpos \
+        + center_ypos * center_ypos \
+        + x1 * x1 + y1 * y1 - 2 * \
+        (center_xpos * x1 + center_ypos * y1) \
+        - size * size
+    i = b * b - 4 * a * c
+    u = (-b + np.sqrt(np.maximum(i, 0))) / (2 * a)
+
+    return np.where(near & (i >= 0) & (u >= 0) & (u <= 1), u, np.inf)
+
+def diamond_ray_fractions(x1, y1, x2, y2, center_xpos, center_ypos, size):
+    """
+    Array version of Diamond.ray_intersection, returning the fraction of
+    each ray at which it is clipped or inf, see circle_ray_fractions
+    """
+
+    dx = x2 - x1
+    dy = y2 - y1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Left lower edge
+        x3 = center_xpos - size
+        y4 = center_ypos + size
+        denom = (y4 - center_ypos) * dx - (center_xpos - x3) * dy
+        ua = ((center_xpos - x3) * (y1 - center_ypos) \
+            - (y4 - center_ypos) * (x1 - x3)) / denom
+        ub = (dx * (y1 - center_ypos) - dy * (x1 - x3)) / denom
+        first = (denom != 0) & (ua >= 0) & (ua <= 1) & (ub >= 0) & (ub <= 1)
+
+        # Right lower edge, only tried if the left one is not parallel
+        x3 = center_xpos + size
+        second_denom = (y4 - center_ypos) * dx - (center_xpos - x3) * dy
+        second_ua = ((center_xpos - x3) * (y1 - center_ypos) \
+            - (y4 - center_ypos) * (x1 - x3)) / second_denom
+        second_ub = (dx * (y1 - center_ypos) - dy * (x1 - x3)) / second_denom
+        second = (denom != 0) & (second_denom != 0) \
+                    & (second_ua >= 0) & (second_ua <= 1) \
+                    & (second_ub >= 0) & (second_ub <= 1)
+
+    return np.where(first, ua, np.where(second, second_ua, np.inf))
+
+def line_ray_fractions(x1, y1, x2, y2, center_xpos, center_ypos, size):
+    """
+    Array version of Line.ray_intersection, returning the fraction of
+    each ray at which it is clipped or inf, see circle_ray_fractions
+    """
+
+    dx = x2 - x1
+    dy = y2 - y1
+    x3 = center_xpos - size
+    x4 = center_xpos + size
+    with np.errstate(divide='ignore', invalid='ignore'):
+        denom = -(x4 - x3) * dy
+        ua = (x4 - x3) * (y1 - center_ypos) / denom
+        ub = (dx * (y1 - center_ypos) - dy * (x1 - x3)) / denom
+        hit = (denom != 0) & (ua >= 0) & (ua <= 1) & (ub >= 0) & (ub <= 1)
+
+    return np.where(hit, ua, np.inf)
+
+class Scene:
+    """
+    A set of visual objects of mixed shapes. Scene.ray_intersections clips
+    every ray at its nearest hit with any of the objects, so a scene can be
+    passed to SensorAgent wherever a single visual object is.
+
+    Objects of the same shape are clipped against all rays with one call of
+    their array kernel. Objects whose bounding box does not overlap the
+    bounding box of the rays are skipped. Shapes without a kernel fall back
+    on their own ray_intersections.
+
+    """
+
+    __slots__ = ('objects', '_groups', '_others')
+
+    def __init__(self, objects=()):
+
+        self.objects = []
+        self._groups = { shape: [] for shape in SHAPE_KERNELS }
+        self._others = []
+        for obj in objects:
+            self.add(obj)
+
+    def add(self, visual_obj):
+
+        self.objects.append(visual_obj)
+        if type(visual_obj) in self._groups:
+            self._groups[type(visual_obj)].append(visual_obj)
+        else:
+            self._others.append(visual_obj)
+
+    def __len__(self):
+
+        return len(self.objects)
+
+    def __iter__(self):
+
+        return iter(self.objects)
+
+    def step(self, step_size):
+
+        for visual_obj in self.objects:
+            visual_obj.step(step_size)
+
+    def ray_intersections(self, x1, y1, x2, y2):
+        """
+        Clips the end-points (x2, y2) of a set of rays in place at the
+        nearest object along each ray
+        """
+
+        dx = x2 - x1
+        dy = y2 - y1
+        left = min(x1.min(), x2.min())
+        right = max(x1.max(), x2.max())
+        top = min(y1.min(), y2.min())
+        bottom = max(y1.max(), y2.max())
+
+        # Objects along a leading axis, ahead of the axes of the rays
+        object_shape = (-1,) + (1,) * x2.ndim
+        fractions = np.full(x2.shape, np.inf)
+        for shape, kernel in SHAPE_KERNELS.items():
+            group = self._groups[shape]
+            if not group:
+                continue
+
+            center_xpos = np.array([ obj.center_xpos for obj in group ])
+            center_ypos = np.array([ obj.center_ypos for obj in group ])
+            size = np.array([ obj.size for obj in group ], dtype=float)
+
+            # Broad phase
+            in_reach = (center_xpos + size >= left) \
+                        & (center_xpos - size <= right) \
+                        & (center_ypos + size >= top) \
+                        & (center_ypos - size <= bottom)
+            if not in_reach.any():
+                continue
+
+            hits = kernel(x1, y1, x2, y2,
+                center_xpos[in_reach].reshape(object_shape),
+                center_ypos[in_reach].reshape(object_shape),
+                size[in_reach].reshape(object_shape))
+            np.minimum(fractions, hits.min(axis=0), out=fractions)
+
+        # Only rays that hit are moved, a ray that misses has an infinite
+        # fraction, which times a zero dx or dy would give nan
+        clip = np.isfinite(fractions)
+        if clip.any():
+            hit_fractions = fractions[clip]
+            x2[clip] = np.broadcast_to(x1, x2.shape)[clip] \
+                        + hit_fractions * dx[clip]
+            y2[clip] = np.broadcast_to(y1, y2.shape)[clip] \
+                        + hit_fractions * dy[clip]
+
+        for visual_obj in self._others:
+            visual_obj.ray_intersections(x1, y1, x2, y2)
+
+# Array kernel of each shape, see Scene
+SHAPE_KERNELS = {Circle: circle_ray_fractions,
+                 Diamond: diamond_ray_fractions,
+                 Line: line_ray_fractions}
+
 if __name__ == '__main__':
     """
     testing
@@ -6,13 +6,17 @@ def readme():
 
 setup(name='relcat',
     version='0.1',
-    description='Uses Python 3.5 or later. Implements a relational categorization task used in (Williams, 2008) and (Williams, 2013).',
+    description='Uses Python 3.9 or later. Implements a relational categorization task used in (Williams, 2008) and (Williams, 2013).',
     author='Nathaniel Rodriguez',
     packages=['relcat'],
     url='https://github.com/Nathaniel-Rodriguez/relcat.git',
+    python_requires='>=3.9',
     install_requires=[
-          'numpy',
-          'matplotlib'
+          'numpy>=1.17'
       ],
+    extras_require={
+          'plot': ['matplotlib'],
+          'vpython': ['vpython']
+      },
     include_package_data=True,
     zip_safe=False)
\ No newline at end of file
@@ -0,0 +1,78 @@
+"""
+evaluate_population has to return the same costs as calling the task on
+each genome, and decode the same networks as map_search_parameters.
+"""
+
+import numpy as np
+import pytest
+from relcat import RelationalCategorization
+from relcat import SensorCTRNN
+
+def fittest_genomes(task, num_genomes, num_samples=30):
+    """
+    Returns the fittest num_genomes of a seeded sample of random genomes.
+    Most random genomes never move the agent and all cost exactly -0.5.
+    """
+
+    X = np.random.RandomState(0).uniform(size=(num_samples,
+                                               task.num_parameters))
+    return X[np.argsort(task.evaluate_population(X))[:num_genomes]]
+
+# A symmetric agent under a centered ball only moves once noise breaks the
+# symmetry, so the symmetric task is seeded and noisy
+@pytest.mark.parametrize('bilateral_symmetry, noise_strength',
+                         [(False, 0.0), (True, 0.5)])
+def test_evaluate_population_matches_call(bilateral_symmetry,
+    noise_strength):
+
+    task = RelationalCategorization(bilateral_symmetry=bilateral_symmetry,
+                                    noise_strength=noise_strength, seed=0)
+    X = fittest_genomes(task, 3)
+
+    costs = task.evaluate_population(X)
+    assert np.all(costs != -0.5)
+
+    # The batched and serial paths sum the weighted inputs in a different
+    # order, which leaves the costs a couple of ulps apart
+    np.testing.assert_allclose(costs, [ task(x) for x in X ],
+                               rtol=0, atol=1e-12)
+
+def test_evaluate_population_single_genome():
+
+    task = RelationalCategorization()
+    x = fittest_genomes(task, 1)[0]
+
+    costs = task.evaluate_population(x)
+
+    assert costs.shape == (1,)
+    assert costs[0] != -0.5
+    np.testing.assert_allclose(costs[0], task(x), rtol=0, atol=1e-12)
+
+def test_evaluate_population_empty():
+
+    task = RelationalCategorization()
+
+    costs = task.evaluate_population(np.zeros((0, task.num_parameters)))
+
+    assert costs.shape == (0,)
+
+@pytest.mark.parametrize('bilateral_symmetry', [False, True])
+def test_decode_population_matches_map_search_parameters(bilateral_symmetry):
+
+    # Without noise a symmetric agent never moves and every genome costs
+    # the same, so the decoded networks are compared as well
+    task = RelationalCategorization(bilateral_symmetry=bilateral_symmetry)
+    X = np.random.RandomState(2).uniform(size=(4, task.num_parameters))
+
+    sensor_weights, circuit_weights, biases, time_constants = \
+        task.decode_population(X)
+
+    for i, x in enumerate(X):
+        network = SensorCTRNN(task.circuit_size, task.num_rays)
+        task.map_search_parameters(x, network)
+        np.testing.assert_array_equal(sensor_weights[i],
+                                      network.sensor_weights)
+        np.testing.assert_array_equal(circuit_weights[i],
+                                      network.circuit_weights)
+        np.testing.assert_array_equal(biases[i], network.biases[:, 0])
+        np.testing.assert_array_equal(time_constants[i], network.taus[:, 0])
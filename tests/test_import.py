@@ -0,0 +1,46 @@
+"""
+import relcat has to stay cheap for pool workers and headless nodes: within
+IMPORT_BUDGET seconds in a fresh interpreter, and without loading any of
+PLOTTING_MODULES.
+"""
+
+import os
+import subprocess
+import sys
+
+# Seconds `import relcat` may take, about twice the 0.19 s measured once
+# matplotlib was no longer imported with the package
+IMPORT_BUDGET = 0.4
+PLOTTING_MODULES = ('matplotlib', 'vpython')
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def import_relcat():
+    """
+    Imports relcat in a fresh interpreter and returns the seconds it took
+    and the plotting modules it loaded
+    """
+
+    script = 'import sys, time\n' \
+             'start = time.perf_counter()\n' \
+             'import relcat\n' \
+             'print(time.perf_counter() - start)\n' \
+             'print(" ".join(name for name in ' + repr(PLOTTING_MODULES) \
+             + ' if name in sys.modules))\n'
+    output = subprocess.check_output([sys.executable, '-c', script],
+                                     cwd=ROOT_DIR).decode().split('\n')
+
+    return float(output[0]), output[1].split()
+
+def test_import_loads_no_plotting_modules():
+
+    seconds, plotting_modules = import_relcat()
+
+    assert plotting_modules == []
+
+def test_import_time_within_budget():
+
+    # Best of a few runs, the first one may also compile the package
+    seconds = min(import_relcat()[0] for i in range(3))
+
+    assert seconds <= IMPORT_BUDGET
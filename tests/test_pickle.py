@@ -0,0 +1,24 @@
+"""
+Tasks are pickled for every job sent to worker processes, so the caches
+and trial records they build up must not be pickled with them.
+"""
+
+import pickle
+import numpy as np
+from relcat import RelationalCategorization
+
+def test_pickle_leaves_out_caches_and_records():
+
+    task = RelationalCategorization(fitness_cache_size=10)
+    size = len(pickle.dumps(task))
+    x = np.random.RandomState(0).uniform(size=task.num_parameters)
+    task.run_test_trial(x, 30, 25)
+    task.fitness_cache.put(b'key', -0.5)
+
+    copy = pickle.loads(pickle.dumps(task))
+
+    assert len(pickle.dumps(task)) == size
+    assert len(copy._cache) == 0
+    assert len(copy.fitness_cache) == 0
+    assert not hasattr(copy, 'recorder')
+    assert copy.run_test_trial(x, 30, 25) == task.run_test_trial(x, 30, 25)
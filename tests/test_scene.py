@@ -0,0 +1,30 @@
+"""
+Scene.ray_intersections has to clip the rays that hit without touching,
+or computing anything for, the rays that miss.
+"""
+
+import warnings
+import numpy as np
+from relcat.visual_objects import Circle
+from relcat.visual_objects import Scene
+
+def test_vertical_ray_that_misses_is_left_alone():
+
+    # The first ray is vertical, its missing hit times dx = 0 is nan
+    x1 = np.array([0., 0.])
+    y1 = np.array([100., 100.])
+    x2 = np.array([0., 50.])
+    y2 = np.array([0., 0.])
+    circle = Circle(10, 25, 50, 0, 3)
+    expected_x2 = x2.copy()
+    expected_y2 = y2.copy()
+    circle.ray_intersections(x1, y1, expected_x2, expected_y2)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        Scene([circle]).ray_intersections(x1, y1, x2, y2)
+
+    assert x2[0] == 0 and y2[0] == 0
+    assert y2[1] > 0
+    np.testing.assert_allclose(x2, expected_x2)
+    np.testing.assert_allclose(y2, expected_y2)